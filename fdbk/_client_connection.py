@@ -1,7 +1,10 @@
 '''DB connection to use with provided development server
 '''
 
+from datetime import datetime
 import json
+from urllib.parse import quote
+
 import requests
 
 from fdbk import DBConnection
@@ -12,9 +15,10 @@ class ClientConnection(DBConnection):
     '''DB connection to use with provided development server
     '''
 
-    def __init__(self, url, token=None):
+    def __init__(self, url, token=None, batch_size=1000):
         self.__url = url
         self.__token = token
+        self.batch_size = int(batch_size)
 
     @staticmethod
     def _get_overwrite_query(overwrite):
@@ -22,6 +26,23 @@ class ClientConnection(DBConnection):
             return ""
         return "?overwrite=true"
 
+    @staticmethod
+    def _get_filter_query(since=None, until=None, limit=None):
+        query = (
+            "" if not since else f"since={since.isoformat()}Z",
+            "" if not until else f"until={until.isoformat()}Z",
+            "" if not limit else f"limit={limit}",
+        )
+        query = "&".join(i for i in query if i)
+        return f"?{query}" if query else ""
+
+    @staticmethod
+    def _serialize_data(data_d):
+        timestamp = data_d.get("timestamp")
+        if not isinstance(timestamp, datetime):
+            return data_d
+        return {**data_d, "timestamp": timestamp.isoformat()}
+
     def add_topic(self, name, overwrite=False, **kwargs):
         query = self._get_overwrite_query(overwrite)
         response = requests.post(
@@ -46,6 +67,25 @@ class ClientConnection(DBConnection):
 
         return response.json()["timestamp"]
 
+    def add_data_many(self, data, overwrite=False):
+        query = self._get_overwrite_query(overwrite)
+        data = list(data)
+
+        results = []
+        for start in range(0, len(data), self.batch_size):
+            batch = [
+                self._serialize_data(i)
+                for i in data[start:start + self.batch_size]]
+            response = requests.post(
+                self.__url + f"/data{query}", json=batch)
+
+            if not response.ok:
+                raise RuntimeError(json.dumps(response.json()))
+
+            results.extend(response.json()["results"])
+
+        return results
+
     def get_topics(self, type_=None, template=None):
         # TODO: Error handling
         query = []
@@ -73,19 +113,74 @@ class ClientConnection(DBConnection):
 
     def get_data(self, topic_id, since=None, until=None, limit=None):
         # TODO: Error handling
+        query = self._get_filter_query(since, until, limit)
+        response = requests.get(f"{self.__url}/topics/{topic_id}/data{query}")
+
+        if not response.ok:
+            raise RuntimeError(json.dumps(response.json()))
+
+        return response.json()
+
+    def get_data_many(self, topic_ids, since=None, until=None, limit=None):
+        if not topic_ids:
+            return {}
+        query = self._get_filter_query(since, until, limit)
+        response = requests.get(
+            f"{self.__url}/data/{','.join(topic_ids)}{query}")
+
+        if not response.ok:
+            raise RuntimeError(json.dumps(response.json()))
+
+        return response.json()
+
+    def get_latest(self, topic_id):
+        response = requests.get(f"{self.__url}/topics/{topic_id}/data/latest")
+
+        if not response.ok:
+            raise RuntimeError(json.dumps(response.json()))
+
+        return response.json()
+
+    def get_latest_many(self, topic_ids=None):
+        if topic_ids is not None and not topic_ids:
+            return {}
+        path = f"/latest/{','.join(topic_ids)}" if topic_ids else "/latest"
+
+        response = requests.get(f"{self.__url}{path}")
+
+        if not response.ok:
+            raise RuntimeError(json.dumps(response.json()))
+
+        return response.json()
+
+    def iter_data(
+            self,
+            topic_id,
+            since=None,
+            until=None,
+            batch_size=1000,
+            cursor=None):
         query = (
             "" if not since else f"since={since.isoformat()}Z",
             "" if not until else f"until={until.isoformat()}Z",
-            "" if not limit else f"limit={limit}",
+            f"batch_size={batch_size}",
         )
         query = "&".join(i for i in query if i)
-        query = f"?{query}" if query else ""
-        response = requests.get(f"{self.__url}/topics/{topic_id}/data{query}")
 
-        if not response.ok:
-            raise RuntimeError(json.dumps(response.json()))
+        while True:
+            cursor_query = f"&cursor={quote(cursor)}" if cursor else ""
+            response = requests.get(
+                f"{self.__url}/topics/{topic_id}/data/iter?"
+                f"{query}{cursor_query}")
 
-        return response.json()
+            if not response.ok:
+                raise RuntimeError(json.dumps(response.json()))
+
+            batch = response.json()
+            yield from batch["data"]
+            cursor = batch["cursor"]
+            if not cursor:
+                return
 
 
 ConnectionClass = ClientConnection
@@ -1,16 +1,216 @@
 '''Base class for DB connections.
 '''
 
-from concurrent.futures import wait, ALL_COMPLETED, ThreadPoolExecutor
+from collections import OrderedDict
+from concurrent.futures import (
+    as_completed,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    TimeoutError)
+from copy import deepcopy
+import json
+from threading import BoundedSemaphore, Lock
+from time import monotonic
+
+from dateutil.parser import isoparse
+
+from fdbk.data_tools import (
+    CHART_FUNCS,
+    combine_run_outputs,
+    post_process,
+    run_data_tools)
+from fdbk.utils.messages import (
+    executor_not_supported,
+    topic_not_found,
+    topic_timed_out)
+
+EXECUTORS = dict(process=ProcessPoolExecutor, thread=ThreadPoolExecutor)
+
+
+class _TopicCache:
+    '''Cache of topic dicts with values from templates
+
+    Each entry is stored with the IDs of the topic and its templates and is
+    dropped when any of them is invalidated. Entries resolved before an
+    invalidation are not stored.
+    '''
+
+    def __init__(self):
+        self._topics = {}
+        self.version = 0
+
+    def get(self, topic_id):
+        entry = self._topics.get(topic_id)
+        return dict(entry[0]) if entry else None
+
+    def put(self, topic_id, topic_d, chain, version):
+        if version == self.version:
+            self._topics[topic_id] = (topic_d, chain)
+
+    def invalidate(self, topic_id):
+        self.version += 1
+        for key, (_, chain) in list(self._topics.items()):
+            if topic_id in chain:
+                self._topics.pop(key, None)
+
+
+class _BoundedExecutor:
+    '''Executor that limits the number of pending jobs
+    '''
+
+    def __init__(self, executor, max_pending=None):
+        self._executor = executor
+        self._slots = BoundedSemaphore(max_pending) if max_pending else None
+
+    def submit(self, timeout, function, *args):
+        '''Submit job when there is room for it
+
+        Returns:
+            Future of the job or None if there was no room in time
+        '''
+        if self._slots and not self._slots.acquire(timeout=timeout):
+            return None
+
+        future = self._executor.submit(function, *args)
+        if self._slots:
+            future.add_done_callback(lambda _: self._slots.release())
+        return future
 
-from fdbk.data_tools import combine_run_outputs, post_process, run_data_tools
-from fdbk.utils.messages import topic_not_found
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+class _LRUCache:
+    '''Thread-safe mapping that drops the least recently used items
+    '''
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
 
 
 class DBConnection:
     '''Base class for DB connections.
     '''
 
+    _topic_cache = None
+
+    _executor = None
+    _executor_options = None
+
+    _statistics_cache = None
+
+    _summary_cache = None
+    _summary_max_age = None
+
+    def _instance_attr(self, name, factory):
+        # Gets attribute of this connection, creating it on first use.
+        # dict.setdefault is atomic, so concurrent first uses get the same
+        # object.
+        value = vars(self).get(name)
+        if value is None:
+            value = vars(self).setdefault(name, factory())
+        return value
+
+    @property
+    def _executor_lock(self):
+        return self._instance_attr('_executor_lock_', Lock)
+
+    def _executor_option(self, name, default=None):
+        return (self._executor_options or {}).get(name, default)
+
+    def configure_executor(
+            self,
+            executor='thread',
+            max_workers=None,
+            max_pending=None,
+            timeout=None):
+        '''Configure executor used to run data tools for multiple topics
+
+        The executor is created on first use and reused until the connection
+        is closed.
+
+        Args:
+            executor: "thread" or "process". With "process", data is read in
+                the calling thread and data tools are run in worker processes.
+                Defaults to "thread".
+            max_workers: Maximum number of workers. Defaults to the default
+                of the executor.
+            max_pending: Maximum number of jobs submitted to the executor at
+                the same time. Unbounded by default.
+            timeout: Time in seconds to wait for the results. Topics that are
+                not finished in time are left out with a warning. No timeout
+                by default.
+
+        Raises:
+            ValueError: Executor is not supported
+        '''
+        if executor not in EXECUTORS:
+            raise ValueError(executor_not_supported(executor))
+
+        self._shutdown_executor()
+        self._executor_options = dict(
+            executor=executor,
+            max_workers=int(max_workers) if max_workers else None,
+            max_pending=int(max_pending) if max_pending else None,
+            timeout=float(timeout) if timeout else None)
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if not self._executor:
+                executor_class = EXECUTORS[
+                    self._executor_option("executor", "thread")]
+                self._executor = _BoundedExecutor(
+                    executor_class(
+                        max_workers=self._executor_option("max_workers")),
+                    self._executor_option("max_pending"))
+            return self._executor
+
+    def close(self):
+        '''Shut down the executor of the connection
+
+        Inheriting classes releasing their own resources should call this
+        too.
+        '''
+        self._shutdown_executor()
+
+    def _shutdown_executor(self):
+        with self._executor_lock:
+            executor = self._executor
+            self._executor = None
+        if executor:
+            executor.shutdown()
+
+    def _enable_topic_cache(self):
+        '''Cache topic dicts resolved with values from templates
+
+        Connections enabling the cache must call _invalidate_topic whenever a
+        topic is added or overwritten.
+        '''
+        self._topic_cache = _TopicCache()
+
+    def _invalidate_topic(self, topic_id):
+        '''Drop cached topic dicts that depend on given topic
+        '''
+        if self._topic_cache:
+            self._topic_cache.invalidate(topic_id)
+
     def validate_template(self, topic_d):
         ''' Validate that topics template is a template topic
 
@@ -66,13 +266,43 @@ class DBConnection:
 
         Raises:
             AssertionError: Topic is a template topic, topic already has data
-                for given timestamp.
+                for given timestamp or the timestamp is older than the
+                retention of the topic allows.
             KeyError: Topic does not exist in DB
             ValueError: Values do not match those defined for the topic
         '''
         raise NotImplementedError(
             "Functionality not implemented by selected DB connection")
 
+    def add_data_many(self, data, overwrite=False):
+        '''Adds multiple data points to DB
+
+        Data points can be for one or more topics. Failing data points do not
+        prevent adding the others. This implementation calls add_data for
+        each data point and can be overridden with a batched implementation.
+
+        Args:
+            data: List of data dicts with "topic_id" and values of the fields.
+                Data dicts can include "timestamp".
+            overwrite: Boolean to enable overwriting existing data-points with
+                the same topic id and timestamp. Disabled by default.
+
+        Returns:
+            List with result dict for each data dict. Result dict has either
+            "timestamp" of the created data point as ISO 8601 string or
+            "error" message.
+        '''
+        results = []
+        for data_d in data:
+            values = dict(data_d)
+            try:
+                timestamp = self.add_data(
+                    values.pop("topic_id", None), values, overwrite=overwrite)
+                results.append(dict(timestamp=timestamp))
+            except (AssertionError, KeyError, ValueError) as error:
+                results.append(dict(error=str(error)))
+        return results
+
     def get_topics_without_templates(self, type_=None, template=None):
         '''Gets list of topic dicts without resolving templates
 
@@ -98,12 +328,12 @@ class DBConnection:
 
     @staticmethod
     def _with_templates(topic_d, templates):
+        # Templates are given as dict of template dicts by ID
         template = topic_d.get('template')
         if template:
             try:
-                template_d = next(
-                    i for i in templates if i.get('id') == template)
-            except StopIteration:
+                template_d = templates[template]
+            except KeyError:
                 raise KeyError(topic_not_found(template))
             return {
                 **DBConnection._with_templates(
@@ -129,9 +359,17 @@ class DBConnection:
             KeyError: Template of a topic not found from the DB
         '''
         topics = self.get_topics_without_templates(type_, template=template)
-        templates = self.get_topics_without_templates(type_='template')
-
-        return [self._with_templates(topic, templates) for topic in topics]
+        templates = {
+            i.get('id'): i for i in
+            self.get_topics_without_templates(type_='template')}
+
+        ret = []
+        for topic in topics:
+            topic_d = None
+            if self._topic_cache:
+                topic_d = self._topic_cache.get(topic.get('id'))
+            ret.append(topic_d or self._with_templates(topic, templates))
+        return ret
 
     def get_topic_without_templates(self, topic_id):
         '''Get topic dict by ID without resolving templates
@@ -160,12 +398,31 @@ class DBConnection:
         Raises:
             KeyError: Topic does not exist in DB
         '''
+        cache = self._topic_cache
+        if not cache:
+            return self._resolve_topic(topic_id)[0]
+
+        topic_d = cache.get(topic_id)
+        if topic_d:
+            return topic_d
+
+        version = cache.version
+        topic_d, chain = self._resolve_topic(topic_id)
+        cache.put(topic_id, topic_d, chain, version)
+        return dict(topic_d)
+
+    def _resolve_topic(self, topic_id):
+        # Returns topic dict with values from templates and IDs of the topic
+        # and its templates
         topic_d = self.get_topic_without_templates(topic_id)
         template = topic_d.get('template')
         if template:
-            return {**self.get_topic(template), **self._remove_empty(topic_d)}
+            template_d, chain = self._resolve_topic(template)
+            return (
+                {**template_d, **self._remove_empty(topic_d)},
+                (topic_id, *chain))
         else:
-            return topic_d
+            return topic_d, (topic_id,)
 
     def get_data(self, topic_id, since=None, until=None, limit=None):
         '''Get all data under given topic
@@ -185,6 +442,64 @@ class DBConnection:
         raise NotImplementedError(
             "Functionality not implemented by selected DB connection")
 
+    def get_data_many(self, topic_ids, since=None, until=None, limit=None):
+        '''Get data of multiple topics
+
+        Connections that can read data of multiple topics at once should
+        override this. By default get_data is called for each topic.
+
+        Args:
+            topic_ids: List of topic IDs
+            since: Datetime of the earliest entry to include
+            until: Datetime of the most recent entry to include
+            limit: Number of entries to include from the most recent for
+                each topic
+
+        Returns:
+            Dict with the list of data dicts of each topic by topic ID
+
+        Raises:
+            KeyError: Topic does not exist in DB
+        '''
+        return {
+            topic_id: self.get_data(topic_id, since, until, limit)
+            for topic_id in topic_ids}
+
+    def iter_data(
+            self,
+            topic_id,
+            since=None,
+            until=None,
+            batch_size=1000,
+            cursor=None):
+        '''Iterate data under given topic from the oldest to the newest
+
+        The cursor of a data dict is its timestamp. Iteration can be resumed
+        after a data dict by passing its cursor.
+
+        Note that this is an unoptimized implementation that reads all of the
+        data with get_data. This method should be overridden by inheriting
+        classes to read the data in batches.
+
+        Args:
+            topic_id: ID of the topic to find
+            since: Datetime of the earliest entry to include
+            until: Datetime of the most recent entry to include
+            batch_size: Number of entries to read at once
+            cursor: Cursor of the data dict to continue iteration after
+
+        Returns:
+            Generator of data dicts under topic with matching name
+
+        Raises:
+            KeyError: Topic does not exist in DB
+        '''
+        after = isoparse(cursor) if cursor else None
+        for data_d in self.get_data(topic_id, since, until):
+            if after and isoparse(data_d["timestamp"]) <= after:
+                continue
+            yield data_d
+
     def get_latest(self, topic_id):
         '''Get latest data element of given topic
 
@@ -205,6 +520,133 @@ class DBConnection:
         '''
         return self.get_data(topic_id)[-1]
 
+    def get_latest_many(self, topic_ids=None):
+        '''Get latest data elements of multiple topics
+
+        Args:
+            topic_ids: List of topic IDs. By default all topics except
+                templates are included.
+
+        Returns:
+            Dict with the latest data dict of each topic by topic ID. The
+            value is None if the topic does not exist or has no data.
+        '''
+        if topic_ids is None:
+            topic_ids = [
+                i["id"] for i in self.get_topics()
+                if i.get("type") != "template"]
+
+        latest = {}
+        for topic_id in topic_ids:
+            try:
+                latest[topic_id] = self.get_latest(topic_id)
+            except (IndexError, KeyError):
+                latest[topic_id] = None
+        return latest
+
+    def _get_aggregated_data(
+            self,
+            topic_d,
+            since=None,
+            until=None,
+            aggregate_to=None,
+            aggregate_with=None,
+            aggregate_always=False):
+        '''Get aggregated data of the topic without reading all of the data
+
+        Connections that maintain pre-aggregated data, e.g., rollups, can
+        override this to answer coarse queries. By default None is returned
+        and the data is aggregated by the data tools.
+
+        Returns:
+            (number of data points, aggregated data) tuple or None
+        '''
+        return None
+
+    def _get_value_statistics(self, topic_d, since=None, until=None):
+        '''Get results of value data tools without reading all of the data
+
+        Connections that maintain running statistics of the data can override
+        this to answer value data tools, e.g., average or max, without reading
+        the data. By default None is returned and the data tools are run
+        against the data.
+
+        Returns:
+            (number of data points, dict of data tool results keyed by
+            (field, method) tuples) tuple or None
+        '''
+        return None
+
+    def _get_tool_inputs(
+            self,
+            topic_d,
+            since=None,
+            until=None,
+            limit=None,
+            aggregate_to=None,
+            aggregate_with=None,
+            aggregate_always=False):
+        # Returns (whether data is needed, number of data points, aggregated
+        # data, value data tool results) tuple. Data is not needed when all
+        # data tools can be run with aggregated data and value data tool
+        # results. Number of data points is None when data is needed for it.
+        aggregated_result = None
+        if aggregate_to and not limit:
+            aggregated_result = self._get_aggregated_data(
+                topic_d,
+                since,
+                until,
+                aggregate_to,
+                aggregate_with,
+                aggregate_always)
+        values_result = None
+        if not limit:
+            values_result = self._get_value_statistics(topic_d, since, until)
+
+        if not aggregated_result and not values_result:
+            return True, None, None, None
+
+        num_entries, aggregated = aggregated_result or (None, None)
+        num_entries, values = values_result or (num_entries, None)
+        needs_data = any(
+            self._needs_data(i, aggregated, values) for i in
+            topic_d["data_tools"])
+        return needs_data, num_entries, aggregated, values
+
+    def _get_data_for_tools(
+            self,
+            topic_d,
+            since=None,
+            until=None,
+            limit=None,
+            aggregate_to=None,
+            aggregate_with=None,
+            aggregate_always=False):
+        # Returns (data, number of data points, aggregated data, value data
+        # tool results) tuple, see _get_tool_inputs
+        needs_data, num_entries, aggregated, values = self._get_tool_inputs(
+            topic_d,
+            since,
+            until,
+            limit,
+            aggregate_to,
+            aggregate_with,
+            aggregate_always)
+
+        data_d = None
+        if needs_data:
+            data_d = self.get_data(topic_d["id"], since, until, limit)
+        if num_entries is None:
+            num_entries = len(data_d)
+        return data_d, num_entries, aggregated, values
+
+    @staticmethod
+    def _needs_data(instruction, aggregated, values):
+        if instruction.get("method") in CHART_FUNCS:
+            return not aggregated
+        return (instruction.get("field"), instruction.get("method")) not in (
+            values or {})
+
     def get_summary(
             self,
             topic_id,
@@ -232,26 +674,50 @@ class DBConnection:
         Raises:
             KeyError: Topic does not exist in DB
         '''
-        data_d = self.get_data(topic_id, since, until, limit)
         topic_d = self.get_topic(topic_id)
+        params = (
+            since,
+            until,
+            limit,
+            aggregate_to,
+            aggregate_with,
+            aggregate_always,
+        )
+
+        key = self._summary_key(topic_d, params)
+        cached = self._summary_cache.get(key) if key else None
+        if cached and (not self._summary_max_age or (
+                monotonic() - cached[0] <= self._summary_max_age)):
+            return deepcopy(cached[1])
+
+        data_d, num_entries, aggregated, values = self._get_data_for_tools(
+            topic_d, *params)
 
         summary_d = {
             "topic": topic_d["name"],
             "description": topic_d["description"],
             "units": topic_d["units"],
-            "num_entries": len(data_d),
+            "num_entries": num_entries,
             "statistics": [],
             "warnings": []
         }
 
         results, warnings = run_data_tools(
-            topic_d, data_d, aggregate_to, aggregate_with, aggregate_always,)
+            topic_d,
+            data_d,
+            aggregate_to,
+            aggregate_with,
+            aggregate_always,
+            aggregated,
+            values)
         summary_d["warnings"].extend(warnings)
 
         results, warnings = post_process(results)
         summary_d["statistics"] = results
         summary_d["warnings"].extend(warnings)
 
+        if key:
+            self._summary_cache.put(key, (monotonic(), deepcopy(summary_d)))
         return summary_d
 
     def _get_topic_statistics(
@@ -263,24 +729,134 @@ class DBConnection:
             aggregate_to=None,
             aggregate_with=None,
             aggregate_always=False):
-        data_d = self.get_data(topic_d.get("id"), since, until, limit)
+        # Job run in the thread executor, reads the data of the topic and
+        # runs its data tools with sketches for combining percentiles
+        data_d, _, aggregated, values = self._get_data_for_tools(
+            topic_d,
+            since,
+            until,
+            limit,
+            aggregate_to,
+            aggregate_with,
+            aggregate_always)
         return run_data_tools(
             topic_d,
             data_d,
             aggregate_to,
             aggregate_with,
-            aggregate_always)
+            aggregate_always,
+            aggregated,
+            values,
+            True)
+
+    def configure_summary_cache(self, max_size=256, max_age=None):
+        '''Cache results of get_summary
+
+        Cached summaries are reused for the same since, until and other
+        arguments while the data version of the topic and the topic itself
+        stay the same, see _get_data_version. With max_age, summaries are
+        reused for at most max_age seconds. Connections that do not provide
+        data versions only cache summaries with max_age, so their summaries
+        can miss data written up to max_age seconds ago.
+
+        Args:
+            max_size: Maximum number of cached summaries. Set to 0 to
+                disable the cache. Defaults to 256.
+            max_age: Maximum age of a cached summary in seconds. Unlimited by
+                default.
+        '''
+        max_size = int(max_size) if max_size else 0
+        self._summary_cache = _LRUCache(max_size) if max_size else None
+        self._summary_max_age = float(max_age) if max_age else None
 
-    def _run_data_tools_for_many(self,
-                                 topic_ids=None,
-                                 template=None,
-                                 since=None,
-                                 until=None,
-                                 limit=None,
-                                 aggregate_to=None,
-                                 aggregate_with=None,
-                                 aggregate_always=False):
-        executor = ThreadPoolExecutor()
+    def _summary_key(self, topic_d, params):
+        if not self._summary_cache:
+            return None
+
+        max_age = self._summary_max_age
+        version = self._get_data_version(topic_d["id"])
+        if version is None and not max_age:
+            return None
+
+        return (
+            topic_d["id"],
+            version,
+            json.dumps(topic_d, sort_keys=True, default=str),
+            *params)
+
+    def _get_data_version(self, topic_id):
+        '''Get version of the topic data
+
+        Connections that can tell when data of a topic changes can override
+        this to let the data tool outputs of unchanged topics be reused in
+        overviews. The version must change whenever data returned by get_data
+        could change. By default None is returned and nothing is reused.
+
+        Args:
+            topic_id: ID of the topic
+
+        Returns:
+            Hashable version of the data or None
+        '''
+        return None
+
+    def _statistics_key(self, topic_d, params):
+        version = self._get_data_version(topic_d["id"])
+        if version is None:
+            return None
+
+        self._instance_attr('_statistics_cache', _LRUCache)
+        return (
+            topic_d["id"],
+            version,
+            json.dumps(topic_d, sort_keys=True, default=str),
+            params)
+
+    @staticmethod
+    def _remaining(deadline):
+        return max(deadline - monotonic(), 0) if deadline else None
+
+    def _get_run_arguments_many(self, topics, params):
+        # Reads data of the topics in the calling thread for the process
+        # executor. Returns dict of run_data_tools arguments by topic ID,
+        # with sketches for combining percentiles.
+        inputs = {
+            topic_d["id"]: self._get_tool_inputs(topic_d, *params)
+            for topic_d in topics}
+        since, until, limit, *aggregate_params = params
+        data = self.get_data_many(
+            [i for i, (needs_data, *_) in inputs.items() if needs_data],
+            since,
+            until,
+            limit)
+        return {
+            topic_id: (
+                data.get(topic_id),
+                *aggregate_params,
+                aggregated,
+                values,
+                True)
+            for topic_id, (_, _, aggregated, values) in inputs.items()}
+
+    def _run_data_tools_for_many(self, **kwargs):
+        for topic_d, output in self._iter_data_tools_for_many(**kwargs):
+            if topic_d is None:
+                return output
+
+    def _iter_data_tools_for_many(self,
+                                  topic_ids=None,
+                                  template=None,
+                                  since=None,
+                                  until=None,
+                                  limit=None,
+                                  aggregate_to=None,
+                                  aggregate_with=None,
+                                  aggregate_always=False):
+        # Yields (topic dict, run output) tuples as topics are finished and
+        # finally (None, combined result dict)
+        executor = self._get_executor()
+        timeout = self._executor_option("timeout")
+        deadline = monotonic() + timeout if timeout else None
         warnings = []
 
         if topic_ids:
@@ -302,7 +878,7 @@ class DBConnection:
             "warnings": warnings
         }
 
-        jobs = []
+        pending = []
         params = (
             since,
             until,
@@ -315,21 +891,63 @@ class DBConnection:
             if topic_d["type"] == "template":
                 continue
 
-            jobs.append(
-                executor.submit(
-                    self._get_topic_statistics, topic_d, *params))
+            key = self._statistics_key(topic_d, params)
+            cached = self._statistics_cache.get(key) if key else None
+            pending.append((topic_d, key, cached))
 
-            result_d["topic_names"].append(topic_d["name"])
-            result_d["fields"].extend(topic_d["fields"])
+        arguments = None
+        if self._executor_option("executor") == "process":
+            # Data is read sequentially and only data tools are run in the
+            # worker processes
+            arguments = self._get_run_arguments_many(
+                [topic_d for topic_d, _, cached in pending if not cached],
+                params)
 
-        wait(jobs, return_when=ALL_COMPLETED)
+        jobs = []
+        keys = {}
+        for topic_d, key, cached in pending:
+            if cached:
+                job = Future()
+                job.set_result(deepcopy(cached))
+            else:
+                function, args = self._get_topic_statistics, params
+                if arguments is not None:
+                    function, args = run_data_tools, arguments[topic_d["id"]]
+                job = executor.submit(
+                    self._remaining(deadline), function, topic_d, *args)
+                keys[job] = key
+            jobs.append((topic_d, job))
+
+        topics_by_job = {job: topic_d for topic_d, job in jobs if job}
+        outputs = {}
+        try:
+            for job in as_completed(
+                    topics_by_job, timeout=self._remaining(deadline)):
+                outputs[job] = job.result()
+                if keys.get(job):
+                    self._statistics_cache.put(
+                        keys[job], deepcopy(outputs[job]))
+                yield topics_by_job[job], outputs[job]
+        except TimeoutError:
+            pass
+
+        for topic_d, job in jobs:
+            if job in outputs:
+                result_d["topic_names"].append(topic_d["name"])
+                result_d["fields"].extend(topic_d["fields"])
+                continue
+            # Topics that timed out are only listed in the warnings
+            if job:
+                job.cancel()
+            result_d["warnings"].append(topic_timed_out(topic_d))
 
-        results, warnings = combine_run_outputs(job.result() for job in jobs)
+        results, warnings = combine_run_outputs(
+            outputs[job] for _, job in jobs if job in outputs)
         result_d["statistics"] = results
         result_d["warnings"].extend(warnings)
 
         result_d["fields"] = list(set(result_d["fields"]))
-        return result_d
+        yield None, result_d
 
     def get_overview(
             self,
@@ -372,5 +990,55 @@ class DBConnection:
             aggregate_with=aggregate_with,
             aggregate_always=aggregate_always)
 
+    def iter_overview(
+            self,
+            topic_ids=None,
+            template=None,
+            since=None,
+            until=None,
+            limit=None,
+            aggregate_to=None,
+            aggregate_with=None,
+            aggregate_always=False):
+        '''Get overview of the data progressively
+
+        Statistics of each topic are yielded as soon as they are ready. The
+        last item has the same overview as get_overview would return.
+
+        Args:
+            See get_overview
+
+        Returns:
+            Generator of dicts. Dicts with "type" "topic" have "topic_id",
+            "topic_name", "statistics" and "warnings" of a single topic. The
+            last dict has "type" "overview" and the overview as "overview".
+
+        Raises:
+            KeyError: Topic does not exist in DB
+        '''
+        for topic_d, output in self._iter_data_tools_for_many(
+                topic_ids=topic_ids,
+                template=template,
+                since=since,
+                until=until,
+                limit=limit,
+                aggregate_to=aggregate_to,
+                aggregate_with=aggregate_with,
+                aggregate_always=aggregate_always):
+            if topic_d is None:
+                yield dict(type="overview", overview=output)
+                continue
+
+            # Post-processing modifies the statistics that are still needed
+            # for the overview
+            results, warnings = output
+            results, post_warnings = post_process(deepcopy(results))
+            yield dict(
+                type="topic",
+                topic_id=topic_d["id"],
+                topic_name=topic_d["name"],
+                statistics=results,
+                warnings=warnings + post_warnings)
+
 
 ConnectionClass = DBConnection
@@ -0,0 +1,205 @@
+'''Gorilla-style compression of time series columns
+
+Timestamps and ints are encoded with delta-of-delta encoding and floats by
+XORing each value with the previous one, as described in "Gorilla: A Fast,
+Scalable, In-Memory Time Series Database" (Pelkonen et al., 2015).
+'''
+
+from array import array
+import struct
+
+_DOUBLE = struct.Struct('>d')
+_UINT64 = struct.Struct('>Q')
+
+# (control bits, number of control bits, number of value bits)
+_DOD_BUCKETS = (
+    (0b10, 2, 7),
+    (0b110, 3, 9),
+    (0b1110, 4, 12),
+)
+_DOD_FALLBACK = (0b1111, 4, 64)
+
+
+class BitWriter:
+    '''Write values bit by bit into bytes
+    '''
+
+    def __init__(self):
+        self._out = bytearray()
+        self._acc = 0
+        self._nbits = 0
+
+    def write(self, value, nbits):
+        self._acc = (self._acc << nbits) | (value & ((1 << nbits) - 1))
+        self._nbits += nbits
+        while self._nbits >= 8:
+            self._nbits -= 8
+            self._out.append((self._acc >> self._nbits) & 0xFF)
+        self._acc &= (1 << self._nbits) - 1
+
+    def to_bytes(self):
+        out = bytearray(self._out)
+        if self._nbits:
+            out.append((self._acc << (8 - self._nbits)) & 0xFF)
+        return bytes(out)
+
+
+class BitReader:
+    '''Read values bit by bit from bytes
+    '''
+
+    def __init__(self, data):
+        self._data = data
+        self._pos = 0
+
+    def read(self, nbits):
+        start = self._pos >> 3
+        end = (self._pos + nbits + 7) >> 3
+        chunk = int.from_bytes(self._data[start:end], 'big')
+        shift = end * 8 - self._pos - nbits
+        self._pos += nbits
+        return (chunk >> shift) & ((1 << nbits) - 1)
+
+    def read_bit(self):
+        return self.read(1)
+
+
+def _signed(value, nbits):
+    if value >= 1 << (nbits - 1):
+        return value - (1 << nbits)
+    return value
+
+
+def encode_ints(values):
+    '''Encode int64 values with delta-of-delta encoding
+
+    Raises:
+        ValueError: Delta of the values does not fit in 64 bits
+    '''
+    writer = BitWriter()
+    if not len(values):
+        return writer.to_bytes()
+
+    writer.write(values[0], 64)
+    previous = values[0]
+    previous_delta = 0
+    for j, value in enumerate(values[1:]):
+        delta = value - previous
+        dod = delta - previous_delta
+        if not -2**63 <= dod < 2**63 or not -2**63 <= delta < 2**63:
+            raise ValueError('Delta does not fit in 64 bits.')
+
+        if j == 0:
+            writer.write(delta, 64)
+        elif dod == 0:
+            writer.write(0, 1)
+        else:
+            for control, control_bits, value_bits in _DOD_BUCKETS + (
+                    _DOD_FALLBACK,):
+                limit = 1 << (value_bits - 1)
+                if -limit <= dod < limit:
+                    writer.write(control, control_bits)
+                    writer.write(dod, value_bits)
+                    break
+
+        previous = value
+        previous_delta = delta
+
+    return writer.to_bytes()
+
+
+def decode_ints(data, count):
+    '''Decode delta-of-delta encoded int64 values
+
+    Returns:
+        array of type 'q'
+    '''
+    values = array('q')
+    if not count:
+        return values
+
+    reader = BitReader(data)
+    values.append(_signed(reader.read(64), 64))
+    if count == 1:
+        return values
+
+    delta = _signed(reader.read(64), 64)
+    values.append(values[-1] + delta)
+    for _ in range(count - 2):
+        if reader.read_bit():
+            value_bits = 64
+            for _, control_bits, bucket_bits in _DOD_BUCKETS:
+                if not reader.read_bit():
+                    value_bits = bucket_bits
+                    break
+            delta += _signed(reader.read(value_bits), value_bits)
+        values.append(values[-1] + delta)
+
+    return values
+
+
+def encode_floats(values):
+    '''Encode floats by XORing them with the previous value
+    '''
+    writer = BitWriter()
+    if not len(values):
+        return writer.to_bytes()
+
+    previous, = _UINT64.unpack(_DOUBLE.pack(values[0]))
+    writer.write(previous, 64)
+    leading, trailing = -1, -1
+    for value in values[1:]:
+        bits, = _UINT64.unpack(_DOUBLE.pack(value))
+        xor = bits ^ previous
+        previous = bits
+
+        if not xor:
+            writer.write(0, 1)
+            continue
+        writer.write(1, 1)
+
+        new_leading = min(64 - xor.bit_length(), 31)
+        new_trailing = (xor & -xor).bit_length() - 1
+        if leading >= 0 and new_leading >= leading and (
+                new_trailing >= trailing):
+            writer.write(0, 1)
+            writer.write(xor >> trailing, 64 - leading - trailing)
+            continue
+
+        leading, trailing = new_leading, new_trailing
+        meaningful = 64 - leading - trailing
+        writer.write(1, 1)
+        writer.write(leading, 5)
+        writer.write(meaningful - 1, 6)
+        writer.write(xor >> trailing, meaningful)
+
+    return writer.to_bytes()
+
+
+def decode_floats(data, count):
+    '''Decode XOR encoded floats
+
+    Returns:
+        array of type 'd'
+    '''
+    values = array('d')
+    if not count:
+        return values
+
+    reader = BitReader(data)
+    previous = reader.read(64)
+    values.append(_DOUBLE.unpack(_UINT64.pack(previous))[0])
+    leading, trailing = 0, 0
+    for _ in range(count - 1):
+        if reader.read_bit():
+            if reader.read_bit():
+                leading = reader.read(5)
+                trailing = 64 - leading - (reader.read(6) + 1)
+            previous ^= reader.read(64 - leading - trailing) << trailing
+        values.append(_DOUBLE.unpack(_UINT64.pack(previous))[0])
+
+    return values
+
+
+ENCODERS = dict(q=encode_ints, d=encode_floats)
+DECODERS = dict(q=decode_ints, d=decode_floats)
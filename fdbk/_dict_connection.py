@@ -1,26 +1,110 @@
 '''Example DB connection implemented with Python dict as the storage
 '''
 
+from contextlib import contextmanager, ExitStack
 from os.path import expanduser
+from threading import Event, Lock, RLock, Thread
 import json
 
+from dateutil.parser import isoparse
+
 from fdbk import DBConnection
 from fdbk.utils import (
     generate_data_entry,
-    generate_data_response,
     generate_topic_dict,
     generate_topic_response,
     generate_topics_list,
     timestamp_as_str)
 from fdbk.utils.messages import *
+from ._dict_log import DataLog
+from ._dict_rollups import (
+    aggregate_rollups, rollup_statistics, summarize_rollups, uses_rollups)
+from ._dict_segments import TopicStore
+from ._dict_storage import timestamp_to_us, us_to_timestamp
 
 
 class DictConnection(DBConnection):
     '''Example DB connection implemented with Python dict as the storage
+
+    Count, sum, min, max and the last value of data are rolled up into ten
+    minute, one hour and one day buckets as data is added. Summaries and
+    overviews aggregated to data points spanning at least ten buckets are
+    aggregated from the rollups instead of the raw data. Running totals of
+    the data are kept as well, so value data tools like average, min, max
+    and sum are computed from the totals and the rollups. With
+    quantile_accuracy, quantile sketches are rolled up too and percentile
+    data tools are computed from them.
+
+    Topics and data can be added and read from multiple threads. Each topic
+    has its own lock, so operations on one topic do not block operations on
+    other topics.
+
+    Retention of topic data can be limited with "retention" dict in the
+    metadata of the topic or its template. The dict can have "max_age" in
+    seconds and "max_points" keys. Older data points are evicted when data
+    is added.
     '''
 
-    def __init__(self, topics_db_backup=None):
+    def __init__(
+            self,
+            topics_db_backup=None,
+            data_log=None,
+            log_fsync_every=1,
+            snapshot_interval=None,
+            segment_dir=None,
+            segment_size=100000,
+            compression=None,
+            quantile_accuracy=None,
+            executor=None,
+            executor_workers=None,
+            executor_pending=None,
+            overview_timeout=None,
+            summary_cache_size=None,
+            summary_max_age=None):
+        '''Create DictConnection
+
+        Args:
+            topics_db_backup: Path of a JSON file to store topics to.
+            data_log: Path of an append-only log to store topics and data to.
+                Logged topics and data are loaded on startup.
+            log_fsync_every: Number of log records to write before syncing
+                the log to disk. Defaults to 1.
+            snapshot_interval: Interval in seconds for writing snapshots of
+                the data log in background. Snapshots are disabled by default.
+            segment_dir: Directory for memory-mapped segment files. When
+                given, data is sealed into segment files and only data newer
+                than the latest segment is kept in memory.
+            segment_size: Number of data points to keep in memory before
+                sealing them into a segment. Defaults to 100000.
+            compression: Set to "gorilla" to compress sealed segments with
+                delta-of-delta and XOR encoding. Without segment_dir, the
+                compressed segments are kept in memory. Compressed segments
+                are decoded when they are read.
+            quantile_accuracy: Relative accuracy of quantile sketches kept
+                in the rollups. When given, percentile data tools with at
+                least the accuracy are computed from the rollups. Sketches
+                are not kept by default.
+            executor: Executor to run data tools for multiple topics with,
+                "thread" or "process". See configure_executor.
+            executor_workers: Maximum number of executor workers.
+            executor_pending: Maximum number of jobs pending in the executor.
+            overview_timeout: Time in seconds to wait for the data tools of
+                overviews. Topics not finished in time are left out.
+            summary_cache_size: Number of summaries to cache, see
+                configure_summary_cache. Summaries are not cached by default.
+            summary_max_age: Maximum age of cached summaries in seconds.
+        '''
+        self.configure_summary_cache(summary_cache_size, summary_max_age)
+        self.configure_executor(
+            executor or 'thread',
+            executor_workers,
+            executor_pending,
+            overview_timeout)
         self._topics_backup = topics_db_backup
+        self._segment_dir = segment_dir
+        self._segment_size = segment_size
+        self._compression = compression
+        self._quantile_accuracy = quantile_accuracy
         topics = []
 
         if self._topics_backup:
@@ -33,54 +117,374 @@ class DictConnection(DBConnection):
         self._dict = {
             "topics": topics
         }
+        self._topics_index = {}
+        self._enable_topic_cache()
+
+        for i, topic_d in enumerate(topics):
+            self._topics_index[topic_d["id"]] = i
+            self._dict[topic_d["id"]] = self._new_store(topic_d["id"])
+
+        # Lock order: _lock, topic locks in topic order, _log_lock
+        self._lock = RLock()
+        self._log_lock = Lock()
+        self._log = None
+        if data_log:
+            self._log = DataLog(data_log, fsync_every=log_fsync_every)
+            for record in self._log.read_snapshot():
+                self._load(record)
+            for record in self._log.replay():
+                self._replay(record)
+
+        for topic_d in self._dict["topics"]:
+            self._evict(topic_d["id"])
+
+        self._snapshot_lock = Lock()
+        self._stop_snapshots = Event()
+        self._snapshot_thread = None
+        if self._log and snapshot_interval:
+            self._snapshot_thread = Thread(
+                target=self._snapshot_loop,
+                args=(float(snapshot_interval),),
+                daemon=True)
+            self._snapshot_thread.start()
+
+    def _new_store(self, topic_id):
+        return TopicStore(
+            topic_id,
+            self._segment_dir,
+            self._segment_size,
+            self._compression,
+            self._quantile_accuracy)
+
+    @staticmethod
+    def _data_record(topic_id, timestamp_us, values):
+        return dict(
+            topic_id=topic_id,
+            timestamp=us_to_timestamp(timestamp_us).isoformat(),
+            **values)
+
+    @staticmethod
+    def _data_blocks(topic_data, block_size=1000):
+        fields = list(topic_data.columns)
+        for start in range(0, len(topic_data), block_size):
+            end = min(start + block_size, len(topic_data))
+            columns = [topic_data.columns[field][start:end]
+                       for field in fields]
+            timestamps = topic_data.timestamps[start:end]
+            yield dict(
+                topic_id=topic_data.topic_id,
+                fields=fields,
+                rows=[
+                    [us_to_timestamp(timestamp_us).isoformat()] +
+                    [column[j] for column in columns]
+                    for j, timestamp_us in enumerate(timestamps)])
+
+    def _snapshot_records(self, topics, data):
+        for topic_d in topics:
+            yield dict(topic=topic_d)
+        for parts in data:
+            for part in parts:
+                for block in self._data_blocks(part.block()):
+                    yield dict(data_block=block)
+
+    def _load(self, record):
+        if "topic" in record:
+            self._put_topic(record["topic"])
+            return
+
+        block = record["data_block"]
+        store = self._dict[block["topic_id"]]
+        for row in block["rows"]:
+            store.put(
+                timestamp_to_us(isoparse(row[0])),
+                dict(zip(block["fields"], row[1:])))
+
+    @staticmethod
+    def _split_data(data):
+        timestamp_us = timestamp_to_us(data["timestamp"])
+        values = {
+            key: value for key, value in data.items() if key not in (
+                'topic_id', 'timestamp')}
+        return timestamp_us, values
+
+    def _replay(self, record):
+        if "topic" in record:
+            self._put_topic(record["topic"])
+            return
+
+        data = {
+            **record["data"],
+            "timestamp": isoparse(record["data"]["timestamp"])}
+        timestamp_us, values = self._split_data(data)
+        self._dict[data["topic_id"]].put(timestamp_us, values)
+
+    @staticmethod
+    def _retention(topic_d):
+        retention = (topic_d.get("metadata") or {}).get("retention") or {}
+        max_age = retention.get("max_age")
+        return (
+            int(float(max_age) * 1e6) if max_age else None,
+            retention.get("max_points"))
+
+    def _evict(self, topic_id, topic_d=None):
+        if topic_d is None:
+            try:
+                topic_d = self.get_topic(topic_id)
+            except KeyError:
+                return
+        store = self._dict[topic_id]
+        store.set_retention(*self._retention(topic_d))
+        store.evict()
+
+    def _put_topic(self, topic_d):
+        i = self._topics_index.get(topic_d["id"])
+        if i is not None:
+            self._dict["topics"][i] = topic_d
+            self._invalidate_topic(topic_d["id"])
+        else:
+            self._topics_index[topic_d["id"]] = len(self._dict["topics"])
+            self._dict["topics"].append(topic_d)
+            self._dict[topic_d["id"]] = self._new_store(topic_d["id"])
+
+    def _append(self, record):
+        if self._log:
+            with self._log_lock:
+                self._log.append(record)
+
+    @contextmanager
+    def _locked(self):
+        # Blocks all writes for consistent view of topics, data and log
+        with self._lock, ExitStack() as stack:
+            for topic_d in self._dict["topics"]:
+                stack.enter_context(self._dict[topic_d["id"]].lock)
+            with self._log_lock:
+                yield
+
+    def _snapshot_loop(self, interval):
+        while not self._stop_snapshots.wait(interval):
+            self.snapshot()
+
+    def snapshot(self):
+        '''Write snapshot of topics and data and compact the data log
+
+        Only the records logged after the latest snapshot are replayed on
+        startup. Data sealed into segment files is not included in the
+        snapshot.
+        '''
+        if not self._log:
+            return
+
+        # Snapshots are serialised as a finished snapshot removes the rotated
+        # log records, which must all be included in that snapshot.
+        with self._snapshot_lock:
+            with self._locked():
+                self._log.rotate()
+                topics = list(self._dict["topics"])
+                data = [
+                    self._dict[i["id"]].snapshot_parts() for i in topics]
+
+            self._log.write_snapshot(self._snapshot_records(topics, data))
+
+    def sync(self):
+        '''Sync data log to disk
+        '''
+        with self._log_lock:
+            if self._log:
+                self._log.sync()
+
+    def close(self):
+        '''Stop background snapshots and executor and close data log
+        '''
+        super().close()
+        self._stop_snapshots.set()
+        if self._snapshot_thread:
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+
+        with self._locked():
+            if self._log:
+                self._log.close()
+            for topic_d in self._dict["topics"]:
+                self._dict[topic_d["id"]].close()
 
     def _topic_i(self, topic_id):
-        return next(
-            i for i, data in enumerate(
-                self._dict["topics"]) if data["id"] == topic_id)
+        try:
+            return self._topics_index[topic_id]
+        except KeyError:
+            raise KeyError(topic_not_found(topic_id))
 
     def add_topic(self, name, overwrite=False, **kwargs):
         topic_d = generate_topic_dict(name, add_id=True, **kwargs)
         self.validate_template(topic_d)
 
-        try:
-            i = self._topic_i(topic_d["id"])
-            if not overwrite:
+        with self._lock:
+            if topic_d["id"] in self._topics_index and not overwrite:
                 raise KeyError(duplicate_topic_id(topic_d["id"]))
-            self._dict["topics"][i] = topic_d
-        except StopIteration:
-            self._dict["topics"].append(topic_d)
-            self._dict[topic_d["id"]] = []
 
-        if self._topics_backup:
-            with open(expanduser(self._topics_backup), 'w') as f:
-                json.dump({'topics': self._dict["topics"]}, f)
+            self._append(dict(topic=topic_d))
+            self._put_topic(topic_d)
 
-        return topic_d["id"]
+            if self._topics_backup:
+                with open(expanduser(self._topics_backup), 'w') as f:
+                    json.dump({'topics': self._dict["topics"]}, f)
 
-    def _timestamp_i(self, topic_id, timestamp):
-        return next(
-            i for i, data in enumerate(
-                self._dict[topic_id]) if data["timestamp"] == timestamp)
+        return topic_d["id"]
 
-    def add_data(self, topic_id, values, overwrite=False):
+    def _get_data_topic(self, topic_id):
         topic_d = self.get_topic(topic_id)
         if topic_d.get('type') == 'template':
             raise AssertionError('Cannot add data to template topic.')
+        return topic_d
+
+    def add_data(self, topic_id, values, overwrite=False):
+        topic_d = self._get_data_topic(topic_id)
         fields = topic_d["fields"]
 
         data = generate_data_entry(topic_id, fields, values)
+        timestamp_us, values = self._split_data(data)
+        store = self._dict[topic_id]
 
-        try:
-            i = self._timestamp_i(topic_id, data['timestamp'])
-            if not overwrite:
+        with store.lock:
+            store.set_retention(*self._retention(topic_d))
+            if store.expired(timestamp_us):
+                raise AssertionError(
+                    expired_timestamp(topic_d, data['timestamp']))
+            if not overwrite and store.contains(timestamp_us):
                 raise AssertionError(
                     duplicate_timestamp(topic_d, data['timestamp']))
-            self._dict[topic_id][i] = data
-        except StopIteration:
-            self._dict[topic_id].append(data)
 
-        return timestamp_as_str(data['timestamp'])
+            self._append(dict(data=self._data_record(
+                topic_id, timestamp_us, values)))
+            store.put(timestamp_us, values)
+            self._evict(topic_id, topic_d)
+
+        return timestamp_as_str(us_to_timestamp(timestamp_us))
+
+    def add_data_many(self, data, overwrite=False):
+        data = list(data)
+        results = [None] * len(data)
+        indices_by_topic = {}
+        for i, data_d in enumerate(data):
+            indices_by_topic.setdefault(data_d.get("topic_id"), []).append(i)
+
+        for topic_id, indices in indices_by_topic.items():
+            try:
+                topic_d = self._get_data_topic(topic_id)
+            except (AssertionError, KeyError) as error:
+                for i in indices:
+                    results[i] = dict(error=str(error))
+                continue
+
+            entries = []
+            for i in indices:
+                values = {
+                    key: value for key, value in data[i].items()
+                    if key != "topic_id"}
+                try:
+                    entries.append((i, generate_data_entry(
+                        topic_id, topic_d["fields"], values)))
+                except ValueError as error:
+                    results[i] = dict(error=str(error))
+
+            self._add_topic_data(topic_d, entries, overwrite, results)
+
+        return results
+
+    def _add_topic_data(self, topic_d, entries, overwrite, results):
+        # Adds data entries of a topic with a single log write
+        topic_id = topic_d["id"]
+        store = self._dict[topic_id]
+        with store.lock:
+            store.set_retention(*self._retention(topic_d))
+            added = []
+            timestamps = set()
+            for i, data in entries:
+                timestamp_us, values = self._split_data(data)
+                if store.expired(timestamp_us):
+                    results[i] = dict(error=expired_timestamp(
+                        topic_d, data['timestamp']))
+                    continue
+                if not overwrite and (
+                        timestamp_us in timestamps or
+                        store.contains(timestamp_us)):
+                    results[i] = dict(error=duplicate_timestamp(
+                        topic_d, data['timestamp']))
+                    continue
+                timestamps.add(timestamp_us)
+                added.append((i, timestamp_us, values))
+
+            if self._log:
+                with self._log_lock:
+                    self._log.append_many([
+                        dict(data=self._data_record(topic_id, *i[1:]))
+                        for i in added])
+
+            for i, timestamp_us, values in added:
+                store.put(timestamp_us, values)
+                results[i] = dict(timestamp=timestamp_as_str(
+                    us_to_timestamp(timestamp_us)))
+            self._evict(topic_id, topic_d)
+
+    def get_storage_stats(self, topic_id):
+        '''Get storage statistics of a topic
+
+        Args:
+            topic_id: ID of the topic
+
+        Returns:
+            Dict with number of data points, number of sealed segments, size
+            of the segments and compression ratio of the segments
+
+        Raises:
+            KeyError: Topic does not exist in DB
+        '''
+        self._topic_i(topic_id)
+        store = self._dict[topic_id]
+        with store.lock:
+            return store.stats()
+
+    def _get_aggregated_data(
+            self,
+            topic_d,
+            since=None,
+            until=None,
+            aggregate_to=None,
+            aggregate_with=None,
+            aggregate_always=False):
+        store = self._dict[topic_d["id"]]
+        with store.lock:
+            store.set_retention(*self._retention(topic_d))
+            return aggregate_rollups(
+                store,
+                timestamp_to_us(since) if since else None,
+                timestamp_to_us(until) if until else None,
+                aggregate_to,
+                aggregate_with,
+                aggregate_always,
+                topic_d["fields"])
+
+    def _get_value_statistics(self, topic_d, since=None, until=None):
+        data_tools = topic_d["data_tools"]
+        if data_tools and not uses_rollups(data_tools):
+            # The number of data points is only needed without data tools,
+            # otherwise it is taken from the data or aggregated data.
+            return None
+
+        store = self._dict[topic_d["id"]]
+        with store.lock:
+            store.set_retention(*self._retention(topic_d))
+            bucket = summarize_rollups(
+                store,
+                timestamp_to_us(since) if since else None,
+                timestamp_to_us(until) if until else None)
+            if not bucket.count:
+                return None
+            return bucket.count, rollup_statistics(bucket, data_tools)
+
+    def _get_data_version(self, topic_id):
+        store = self._dict[topic_id]
+        with store.lock:
+            return store.version
 
     def get_topics_without_templates(self, type_=None, template=None):
         topics = self._dict["topics"]
@@ -92,31 +496,79 @@ class DictConnection(DBConnection):
         return generate_topics_list(topics)
 
     def _get_topic_dict(self, topic_id):
-        try:
-            return next(
-                i for i in self._dict["topics"] if i["id"] == topic_id)
-        except StopIteration:
-            raise KeyError(topic_not_found(topic_id))
+        return self._dict["topics"][self._topic_i(topic_id)]
 
     def get_topic_without_templates(self, topic_id):
         return generate_topic_response(self._get_topic_dict(topic_id))
 
     def get_data(self, topic_id, since=None, until=None, limit=None):
         topic_d = self.get_topic(topic_id)
-        fields = topic_d["fields"]
-        data = self._dict[topic_id]
+        store = self._dict[topic_id]
+        with store.lock:
+            store.set_retention(*self._retention(topic_d))
+            return store.rows(
+                timestamp_to_us(since) if since else None,
+                timestamp_to_us(until) if until else None,
+                limit,
+                topic_d["fields"])
 
-        if since:
-            data = (i for i in data if i.get('timestamp') >= since)
-        if until:
-            data = (i for i in data if i.get('timestamp') <= until)
+    def get_data_many(self, topic_ids, since=None, until=None, limit=None):
+        topics = [self.get_topic(topic_id) for topic_id in topic_ids]
+        since_us = timestamp_to_us(since) if since else None
+        until_us = timestamp_to_us(until) if until else None
 
-        data = list(data)
+        data = {}
+        for topic_d in topics:
+            store = self._dict[topic_d["id"]]
+            with store.lock:
+                store.set_retention(*self._retention(topic_d))
+                data[topic_d["id"]] = store.rows(
+                    since_us, until_us, limit, topic_d["fields"])
+        return data
+
+    def get_latest(self, topic_id):
+        topic_d = self.get_topic(topic_id)
+        store = self._dict[topic_id]
+        with store.lock:
+            store.set_retention(*self._retention(topic_d))
+            rows = store.rows(limit=1, fields=topic_d["fields"])
+
+        if not rows:
+            raise IndexError(no_data(topic_d))
+        return rows[0]
+
+    def iter_data(
+            self,
+            topic_id,
+            since=None,
+            until=None,
+            batch_size=1000,
+            cursor=None):
+        topic_d = self.get_topic(topic_id)
+        store = self._dict[topic_id]
+        batch_size = int(batch_size)
+
+        since_us = timestamp_to_us(since) if since else None
+        until_us = timestamp_to_us(until) if until else None
+        if cursor:
+            after_us = timestamp_to_us(isoparse(cursor)) + 1
+            since_us = after_us if since_us is None else max(
+                since_us, after_us)
 
-        if limit:
-            data = data[-(limit or 0):]
+        while True:
+            with store.lock:
+                store.set_retention(*self._retention(topic_d))
+                rows = store.rows(
+                    since_us,
+                    until_us,
+                    batch_size,
+                    topic_d["fields"],
+                    oldest=True)
 
-        return generate_data_response(data, fields)
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            since_us = timestamp_to_us(isoparse(rows[-1]["timestamp"])) + 1
 
 
 ConnectionClass = DictConnection
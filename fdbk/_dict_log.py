@@ -0,0 +1,155 @@
+'''Append-only log used by DictConnection to persist topics and data
+'''
+
+import json
+import os
+from os.path import exists, expanduser
+from shutil import copyfileobj
+
+
+def _read_records(path, truncate=False):
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return
+
+    with f:
+        valid_until = 0
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b'\n'):
+                break
+
+            valid_until += len(line)
+            yield record
+
+    if truncate and valid_until < os.path.getsize(path):
+        with open(path, 'r+b') as f:
+            f.truncate(valid_until)
+
+
+class DataLog:
+    '''Append-only, line-delimited JSON log with snapshots
+
+    Records are flushed to the OS on every append and synced to disk after
+    every fsync_every appends, when sync is called, or when the log is closed.
+
+    Snapshots are written next to the log with .snapshot suffix. While a
+    snapshot is being written, the log records preceding it are kept in a
+    file with .old suffix.
+    '''
+
+    def __init__(self, path, fsync_every=1):
+        self._path = expanduser(path)
+        self._old_path = f'{self._path}.old'
+        self._snapshot_path = f'{self._path}.snapshot'
+        self._fsync_every = max(int(fsync_every), 1)
+        self._unsynced = 0
+        self._file = None
+
+    @property
+    def path(self):
+        return self._path
+
+    def read_snapshot(self):
+        '''Read records from the latest snapshot
+
+        Returns:
+            Generator of the snapshot records
+        '''
+        return _read_records(self._snapshot_path)
+
+    def replay(self):
+        '''Read records logged after the latest snapshot
+
+        Truncates a partially written record from the end of the log, e.g.,
+        after a crash during write.
+
+        Returns:
+            Generator of the logged records
+        '''
+        yield from _read_records(self._old_path, truncate=True)
+        yield from _read_records(self._path, truncate=True)
+
+    def rotate(self):
+        '''Move current log records aside before writing a snapshot
+
+        The records are appended to the records of a possibly unfinished
+        previous snapshot.
+        '''
+        self.close()
+        if not exists(self._path):
+            return
+
+        if exists(self._old_path):
+            with open(self._old_path, 'ab') as old, \
+                    open(self._path, 'rb') as f:
+                copyfileobj(f, old)
+            os.remove(self._path)
+        else:
+            os.replace(self._path, self._old_path)
+
+    def write_snapshot(self, records):
+        '''Write snapshot and drop log records rotated before it
+
+        Args:
+            records: Iterable of JSON serializable records describing the
+                state at the time of the latest rotate call.
+        '''
+        tmp_path = f'{self._snapshot_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, self._snapshot_path)
+        if exists(self._old_path):
+            os.remove(self._old_path)
+
+    def append(self, record):
+        '''Append record to the log
+
+        Args:
+            record: JSON serializable record to append
+        '''
+        self.append_many([record])
+
+    def append_many(self, records):
+        '''Append records to the log with a single flush
+
+        Args:
+            records: List of JSON serializable records to append
+        '''
+        if not records:
+            return
+        if not self._file:
+            self._file = open(self._path, 'a')
+
+        self._file.write(''.join(json.dumps(i) + '\n' for i in records))
+        self._file.flush()
+
+        self._unsynced += len(records)
+        if self._unsynced >= self._fsync_every:
+            self.sync()
+
+    def sync(self):
+        '''Sync appended records to disk
+        '''
+        if self._file and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        '''Sync and close the log
+        '''
+        if not self._file:
+            return
+
+        self.sync()
+        self._file.close()
+        self._file = None
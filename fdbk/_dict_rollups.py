@@ -0,0 +1,527 @@
+'''Multi-resolution rollups of topic data used by DictConnection
+'''
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from math import ceil
+from numbers import Number
+
+from fdbk.data_tools.functions import QuantileSketch
+from fdbk.data_tools.functions.utils import value_dict
+from fdbk.utils import timestamp_as_str
+from ._dict_storage import _typecode, Column, us_to_timestamp
+
+SECOND = 1000000
+ROLLUP_WIDTHS = (600 * SECOND, 3600 * SECOND, 86400 * SECOND)
+# Minimum number of buckets per aggregated data point
+ROLLUP_RESOLUTION = 10
+ROLLUP_FUNCS = ('average', 'latest', 'max', 'mean', 'min', 'sum')
+# Percentiles of the data tools computed from quantile sketches
+ROLLUP_PERCENTILES = dict(p90=90, p95=95, p99=99, percentile=None)
+
+
+class Bucket:
+    '''Count, sum, min, max and last value of fields in a time range
+
+    With accuracy, quantile sketches of the fields are kept as well.
+    '''
+    __slots__ = ('count', 'last_ts', 'last', 'stats', 'accuracy', 'sketches')
+
+    def __init__(self, accuracy=None):
+        self.count = 0
+        self.last_ts = None
+        self.last = {}
+        self.stats = {}
+        self.accuracy = accuracy
+        self.sketches = {} if accuracy else None
+
+    def add(self, timestamp_us, values):
+        self.count += 1
+        if self.last_ts is None or timestamp_us >= self.last_ts:
+            self.last_ts = timestamp_us
+            self.last = values
+
+        for field, value in values.items():
+            if not isinstance(value, Number):
+                continue
+            if self.sketches is not None:
+                sketch = self.sketches.get(field)
+                if sketch is None:
+                    sketch = self.sketches[field] = QuantileSketch(
+                        self.accuracy)
+                sketch.add(value)
+            stats = self.stats.get(field)
+            if stats is None:
+                self.stats[field] = [1, value, value, value]
+                continue
+            stats[0] += 1
+            stats[1] += value
+            stats[2] = min(stats[2], value)
+            stats[3] = max(stats[3], value)
+
+    def merge(self, other):
+        self.count += other.count
+        if other.last_ts is not None and (
+                self.last_ts is None or other.last_ts >= self.last_ts):
+            self.last_ts = other.last_ts
+            self.last = other.last
+
+        for field, other_stats in other.stats.items():
+            stats = self.stats.get(field)
+            if stats is None:
+                self.stats[field] = list(other_stats)
+                continue
+            stats[0] += other_stats[0]
+            stats[1] += other_stats[1]
+            stats[2] = min(stats[2], other_stats[2])
+            stats[3] = max(stats[3], other_stats[3])
+
+        if self.sketches is None:
+            return
+        if other.sketches is None or other.accuracy != self.accuracy:
+            # Distribution of the other bucket is not known
+            self.sketches = None
+            return
+        for field, other_sketch in other.sketches.items():
+            if field not in self.sketches:
+                self.sketches[field] = QuantileSketch(self.accuracy)
+            self.sketches[field].merge(other_sketch)
+
+    def sketch(self, field, accuracy):
+        '''Quantile sketch of the field with at least the accuracy
+
+        Returns:
+            Sketch, empty sketch if the field has no numeric values or None
+            if the bucket does not have sketches accurate enough
+        '''
+        if self.sketches is None or self.accuracy > accuracy:
+            return None
+        return self.sketches.get(field) or QuantileSketch(self.accuracy)
+
+    def value(self, field, method):
+        '''Value of the field as aggregate_with method would compute it
+        '''
+        if method == 'latest':
+            return self.last.get(field)
+
+        stats = self.stats.get(field)
+        if not stats:
+            return None
+        count, sum_, min_, max_ = stats
+        if method in ('average', 'mean'):
+            if isinstance(sum_, int) and not sum_ % count:
+                # statistics.mean keeps exact means of ints as ints
+                return sum_ // count
+            return sum_ / count
+        return dict(sum=sum_, min=min_, max=max_)[method]
+
+
+class _ExactColumn(Column):
+    # Column that falls back to a list instead of converting ints to floats
+    # or floats to ints, so that values are read with their original types
+    def _prepare(self, value):
+        typecode = self.typecode
+        value_typecode = _typecode(value)
+        if typecode and value is not None and value_typecode != typecode:
+            if value_typecode and (not len(self.values) or (
+                    self.missing is not None and all(self.missing))):
+                self.values = array(
+                    value_typecode, bytes(8 * len(self.values)))
+            else:
+                self._as_list()
+        return super()._prepare(value)
+
+    def item(self, i):
+        return self[i:i + 1][0]
+
+
+class RollupTier:
+    '''Buckets of fixed width kept in time order
+
+    Count, last values and statistics of the buckets are stored in columns,
+    so a bucket only takes a few array items per field. The newest bucket
+    is kept open as a Bucket and written to the columns when data for a
+    newer bucket is added. Other buckets are built when they are read.
+    '''
+
+    def __init__(self, width_us, accuracy=None):
+        self.width = width_us
+        self.accuracy = accuracy
+        self.starts = array('q')
+        self.counts = array('q')
+        self.last_ts = array('q')
+        self.last = {}
+        # Field: (counts, sums, mins, maxs)
+        self.stats = {}
+        # Bucket start: {field: QuantileSketch}
+        self.sketches = {}
+        self.dirty = set()
+        self.open_start = None
+        self.open = None
+
+    def _find(self, start):
+        i = bisect_left(self.starts, start)
+        return i, i < len(self.starts) and self.starts[i] == start
+
+    def _insert(self, i, start):
+        self.starts.insert(i, start)
+        self.counts.insert(i, 0)
+        self.last_ts.insert(i, 0)
+        for column in self.last.values():
+            column.insert(i, None)
+        for counts, *columns in self.stats.values():
+            counts.insert(i, 0)
+            for column in columns:
+                column.insert(i, None)
+
+    def _last(self, field):
+        if field not in self.last:
+            self.last[field] = _ExactColumn.empty(len(self.starts))
+        return self.last[field]
+
+    def _stats(self, field):
+        if field not in self.stats:
+            n = len(self.starts)
+            self.stats[field] = (array('q', bytes(8 * n)), *(
+                _ExactColumn.empty(n) for _ in range(3)))
+        return self.stats[field]
+
+    def _bucket(self, i):
+        if self.starts[i] == self.open_start:
+            return self.open
+
+        bucket = Bucket(self.accuracy)
+        bucket.count = self.counts[i]
+        if bucket.count:
+            bucket.last_ts = self.last_ts[i]
+            bucket.last = {
+                field: column.item(i) for field, column in self.last.items()}
+        for field, (counts, *columns) in self.stats.items():
+            if counts[i]:
+                bucket.stats[field] = [
+                    counts[i], *(column.item(i) for column in columns)]
+        if self.accuracy:
+            bucket.sketches = self.sketches.get(self.starts[i], {})
+        return bucket
+
+    def _set_bucket(self, i, bucket):
+        if self.starts[i] == self.open_start:
+            self.open = bucket
+            return
+
+        self.counts[i] = bucket.count
+        self.last_ts[i] = bucket.last_ts or 0
+        for field in self.last.keys() | bucket.last.keys():
+            self._last(field).set(i, bucket.last.get(field))
+        for field in self.stats.keys() | bucket.stats.keys():
+            counts, *columns = self._stats(field)
+            stats = bucket.stats.get(field) or (0, None, None, None)
+            counts[i] = stats[0]
+            for column, value in zip(columns, stats[1:]):
+                column.set(i, value)
+        if self.accuracy:
+            self.sketches[self.starts[i]] = bucket.sketches
+
+    def _close(self):
+        # Writes the open bucket to the columns
+        if self.open_start is None:
+            return
+        i, _ = self._find(self.open_start)
+        bucket = self.open
+        self.open_start = self.open = None
+        self._set_bucket(i, bucket)
+
+    def add(self, timestamp_us, values, replaced=False):
+        start = timestamp_us - timestamp_us % self.width
+        if start != self.open_start:
+            i, found = self._find(start)
+            if not found:
+                self._insert(i, start)
+            if i == len(self.starts) - 1:
+                self._close()
+                self.open_start = start
+                self.open = Bucket(self.accuracy)
+
+        if replaced:
+            # Values of the replaced data point are not known anymore
+            self.dirty.add(start)
+        elif start == self.open_start:
+            self.open.add(timestamp_us, values)
+        else:
+            bucket = self._bucket(i)
+            bucket.add(timestamp_us, values)
+            self._set_bucket(i, bucket)
+
+    def get(self, start, store):
+        '''Get bucket starting at start, summarized again if it is dirty
+        '''
+        i, _ = self._find(start)
+        if start in self.dirty:
+            bucket = store.summarize(start, start + self.width - 1)
+            self._set_bucket(i, bucket)
+            self.dirty.discard(start)
+            return bucket
+        return self._bucket(i)
+
+    def evict(self, floor_us):
+        n = bisect_right(self.starts, floor_us - self.width)
+        if not n:
+            return
+        if self.open_start is not None and self.open_start <= (
+                self.starts[n - 1]):
+            self.open_start = self.open = None
+        for start in self.starts[:n]:
+            self.dirty.discard(start)
+            self.sketches.pop(start, None)
+        del self.starts[:n]
+        del self.counts[:n]
+        del self.last_ts[:n]
+        for column in self.last.values():
+            column.drop_head(n)
+        for counts, *columns in self.stats.values():
+            del counts[:n]
+            for column in columns:
+                column.drop_head(n)
+
+    def range(self, since_us, until_us):
+        '''Start times of the buckets overlapping the time range
+        '''
+        i = bisect_right(self.starts, since_us - self.width)
+        j = bisect_right(self.starts, until_us)
+        return self.starts[i:j]
+
+
+class Rollups:
+    '''Rollup tiers and running totals of a topic updated on every write
+    '''
+
+    def __init__(self, widths=ROLLUP_WIDTHS, accuracy=None):
+        self.accuracy = accuracy
+        self.tiers = [RollupTier(width, accuracy) for width in widths]
+        self.total = Bucket(accuracy)
+        self.total_dirty = False
+
+    def add(self, timestamp_us, values, replaced=False):
+        for tier in self.tiers:
+            tier.add(timestamp_us, values, replaced)
+        if replaced:
+            self.total_dirty = True
+        else:
+            self.total.add(timestamp_us, values)
+
+    def evict(self, floor_us):
+        for tier in self.tiers:
+            tier.evict(floor_us)
+
+    def tier_for(self, window_us):
+        '''Coarsest tier with enough resolution for the window or None
+        '''
+        tiers = [
+            i for i in self.tiers if i.width * ROLLUP_RESOLUTION <= window_us]
+        return tiers[-1] if tiers else None
+
+
+def aggregate_rollups(
+        store,
+        since_us,
+        until_us,
+        aggregate_to,
+        aggregate_with,
+        aggregate_always,
+        fields):
+    '''Aggregate topic data from rollups like data_tools.aggregate
+
+    Data points are assigned to the aggregation windows by the start of
+    their bucket. Buckets partially outside the requested time range are
+    summarized from raw data.
+
+    Args:
+        store: TopicStore of the topic
+        since_us: Earliest timestamp to include or None
+        until_us: Latest timestamp to include or None
+        aggregate_to: Number of data points to aggregate data to
+        aggregate_with: Value function to use when combining data points
+        aggregate_always: Aggregate data even if there is less data
+        fields: Fields of the topic
+
+    Returns:
+        (number of data points, aggregated data) tuple or None if the data
+        cannot be aggregated from the rollups
+    '''
+    if (aggregate_with or 'average') not in ROLLUP_FUNCS:
+        return None
+    aggregate_with = aggregate_with or 'average'
+
+    bounds = store.bounds(since_us, until_us)
+    if not bounds:
+        return None
+    first, last = bounds
+
+    window = (us_to_timestamp(last) - us_to_timestamp(first)) / aggregate_to
+    window_us = window // timedelta(microseconds=1)
+    tier = store.rollups.tier_for(window_us)
+    if not tier:
+        return None
+
+    buckets = []
+    for start in tier.range(first, last):
+        end = start + tier.width - 1
+        if start < first or end > last:
+            bucket = store.summarize(max(start, first), min(end, last))
+        else:
+            bucket = tier.get(start, store)
+        if bucket.count:
+            buckets.append((max(start, first), bucket))
+
+    num_entries = sum(bucket.count for _, bucket in buckets)
+    if num_entries <= aggregate_to and not aggregate_always:
+        return None
+
+    windows = {}
+    for start, bucket in buckets:
+        i = min(max(ceil((start - first) / window_us) - 1, 0),
+                aggregate_to - 1)
+        if i not in windows:
+            windows[i] = Bucket()
+        windows[i].merge(bucket)
+
+    start = us_to_timestamp(first)
+    aggregated = []
+    for i in sorted(windows):
+        bucket = windows[i]
+        point = dict(timestamp=timestamp_as_str(start + i * window))
+        point["topic_id"] = (
+            store.topic_id if aggregate_with == 'latest' else None)
+        for field in fields:
+            point[field] = bucket.value(field, aggregate_with)
+        aggregated.append(point)
+
+    return num_entries, aggregated
+
+
+def _merge_range(store, tiers, since_us, until_us, bucket):
+    # Merges whole buckets of the first tier in the time range to the bucket
+    # and the edges from the finer tiers or from the raw data
+    if None not in (since_us, until_us) and since_us > until_us:
+        return
+    if not tiers:
+        bucket.merge(store.summarize(since_us, until_us))
+        return
+
+    tier, finer = tiers[0], tiers[1:]
+    start = None if since_us is None else -(-since_us // tier.width) * (
+        tier.width)
+    end = None if until_us is None else (until_us + 1) // tier.width * (
+        tier.width)
+    if None not in (start, end) and start >= end:
+        _merge_range(store, finer, since_us, until_us, bucket)
+        return
+
+    if start is not None:
+        _merge_range(store, finer, since_us, start - 1, bucket)
+    i = 0 if start is None else bisect_left(tier.starts, start)
+    j = len(tier.starts) if end is None else bisect_left(tier.starts, end)
+    for bucket_start in tier.starts[i:j]:
+        bucket.merge(tier.get(bucket_start, store))
+    if end is not None:
+        _merge_range(store, finer, end, until_us, bucket)
+
+
+def summarize_rollups(store, since_us=None, until_us=None):
+    '''Summarize topic data in time range from rollups
+
+    Running totals are used for the full history. Other time ranges are
+    covered with whole buckets of the coarsest tiers and only the edges
+    that are not aligned to the finest tier are summarized from the raw
+    data.
+
+    Args:
+        store: TopicStore of the topic
+        since_us: Earliest timestamp to include or None
+        until_us: Latest timestamp to include or None
+
+    Returns:
+        Bucket with the statistics of the data
+    '''
+    since_us = store.visible_since(since_us)
+    rollups = store.rollups
+    if since_us is None and until_us is None:
+        if rollups.total_dirty:
+            rollups.total = store.summarize(None, None)
+            rollups.total_dirty = False
+        return rollups.total
+
+    bucket = Bucket(rollups.accuracy)
+    _merge_range(
+        store, list(reversed(rollups.tiers)), since_us, until_us, bucket)
+    return bucket
+
+
+def _rollup_percentile(bucket, field, method, parameters):
+    # Returns (True, result) if the percentile is computed from the sketches
+    parameters = parameters or {}
+    try:
+        percentile = float(parameters.get("percentile", 50) if (
+            method == 'percentile') else ROLLUP_PERCENTILES[method])
+        sketch = bucket.sketch(field, float(parameters.get("accuracy", 0.01)))
+    except (TypeError, ValueError):
+        return False, None
+    if sketch is None:
+        return False, None
+    if not sketch.count:
+        return True, None
+
+    return True, value_dict(
+        type=method,
+        field=field,
+        value=sketch.quantile(percentile / 100),
+        percentile=percentile,
+        sketch=sketch.to_dict())
+
+
+def uses_rollups(data_tools):
+    '''Check if any of the data tools can be computed from rollups
+    '''
+    methods = (*ROLLUP_FUNCS, *ROLLUP_PERCENTILES)
+    return any(i.get("method") in methods for i in data_tools)
+
+
+def rollup_statistics(bucket, data_tools):
+    '''Run value data tools that can be computed from the bucket
+
+    Percentiles are computed from the quantile sketches of the bucket when
+    the sketches are at least as accurate as the data tools require.
+
+    Args:
+        bucket: Bucket of the data
+        data_tools: Data tools of the topic
+
+    Returns:
+        Dict of data tool results keyed by (field, method) tuples
+    '''
+    results = {}
+    skipped = set()
+    for instruction in data_tools:
+        field = instruction.get("field")
+        method = instruction.get("method")
+        if method in ROLLUP_PERCENTILES:
+            computed, result = _rollup_percentile(
+                bucket, field, method, instruction.get("parameters"))
+            if not computed or results.get(
+                    (field, method), result) != result:
+                # Data tools with other parameters are run with the data
+                skipped.add((field, method))
+            results[(field, method)] = result
+            continue
+        if method not in ROLLUP_FUNCS:
+            continue
+
+        value = bucket.value(field, method)
+        results[(field, method)] = value_dict(
+            type=method, field=field, value=value) if (
+                value is not None or method == 'latest') else None
+
+    for key in skipped:
+        del results[key]
+    return results
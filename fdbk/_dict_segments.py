@@ -0,0 +1,610 @@
+'''Sealed segment files and segmented topic storage used by DictConnection
+'''
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+import json
+import mmap
+import os
+from os.path import exists, expanduser, join
+import struct
+import sys
+from urllib.parse import quote
+from uuid import uuid4
+from threading import RLock
+
+from ._dict_compression import DECODERS, ENCODERS
+from ._dict_rollups import Bucket, Rollups
+from ._dict_storage import Column, TopicData, timestamp_to_us
+
+MAGIC = b'FDBKSEG1'
+_HEADER_LEN = struct.Struct('<Q')
+_ALIGN = 8
+
+
+def _padding(length):
+    return b'\0' * (-length % _ALIGN)
+
+
+class _JsonColumn:
+    # Object column of a segment, decoded on each read
+    def __init__(self, buffer):
+        self._buffer = buffer
+
+    def __getitem__(self, key):
+        return json.loads(bytes(self._buffer))[key]
+
+    def to_column(self):
+        return Column(self[:])
+
+
+def encode_segment(topic_data, compression=None):
+    '''Encode topic data into segment bytes
+
+    Timestamps and typed columns are written as fixed-width arrays, missing
+    value masks as byte arrays and object columns as JSON. With compression
+    set to "gorilla", timestamps and typed columns are encoded with
+    delta-of-delta and XOR encoding instead. Offsets of the sections are
+    stored in a JSON header.
+
+    Args:
+        topic_data: TopicData to encode
+        compression: None or "gorilla"
+
+    Returns:
+        Segment as bytes
+    '''
+    if compression not in (None, 'gorilla'):
+        raise ValueError(f'Compression {compression} is not supported.')
+
+    sections = []
+    offset = 0
+    raw_nbytes = 0
+
+    def add(data, raw=None):
+        nonlocal offset, raw_nbytes
+        section = dict(offset=offset, nbytes=len(data))
+        raw_nbytes += len(data) if raw is None else len(raw)
+        sections.append(data + _padding(len(data)))
+        offset += len(data) + len(_padding(len(data)))
+        return section
+
+    def add_typed(values):
+        raw = values.tobytes()
+        if not compression:
+            return add(raw)
+        try:
+            section = add(ENCODERS[values.typecode](values), raw)
+        except ValueError:
+            return add(raw)
+        section["encoding"] = compression
+        return section
+
+    header = dict(
+        topic_id=topic_data.topic_id,
+        count=len(topic_data),
+        min_ts=topic_data.timestamps[0],
+        max_ts=topic_data.timestamps[-1],
+        byteorder=sys.byteorder,
+        timestamps=add_typed(topic_data.timestamps),
+        columns={})
+
+    for field, column in topic_data.columns.items():
+        typecode = column.typecode
+        if typecode:
+            column_d = dict(typecode=typecode, values=add_typed(column.values))
+            if column.missing is not None:
+                column_d["missing"] = add(column.missing.tobytes())
+        else:
+            column_d = dict(json=add(json.dumps(column[:]).encode()))
+        header["columns"][field] = column_d
+
+    header["raw_nbytes"] = raw_nbytes
+    header_b = json.dumps(header).encode()
+    return b''.join(
+        [MAGIC, _HEADER_LEN.pack(len(header_b)),
+         header_b, _padding(len(header_b))] + sections)
+
+
+def write_segment(path, data):
+    '''Write encoded segment to a file
+
+    Args:
+        path: Path of the segment file
+        data: Segment bytes from encode_segment
+    '''
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class Segment(TopicData):
+    '''Read-only topic data backed by encoded segment bytes
+
+    Segments are either memory-mapped from a segment file or held in memory
+    as bytes. Only the header of the segment is decoded when the segment is
+    opened. Uncompressed data is read from the segment when it is accessed.
+    Compressed data is decoded into a block of TopicData on each access.
+    Timestamps of compressed segments are decoded once for finding data
+    points.
+    '''
+
+    def __init__(self, path=None, buffer=None):
+        self.path = path
+        self._mmap = None
+        if path:
+            with open(path, 'rb') as f:
+                self._mmap = mmap.mmap(
+                    f.fileno(), 0, access=mmap.ACCESS_READ)
+            buffer = self._mmap
+
+        buffer = memoryview(buffer)
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f'{path} is not a segment file.')
+        header_start = len(MAGIC) + _HEADER_LEN.size
+        header_len, = _HEADER_LEN.unpack(buffer[len(MAGIC):header_start])
+        header = json.loads(
+            bytes(buffer[header_start:header_start + header_len]))
+        if header["byteorder"] != sys.byteorder:  # pragma: no cover
+            raise ValueError(f'{path} was written with other byte order.')
+
+        self._data = buffer[
+            header_start + header_len + len(_padding(header_len)):]
+        self._header = header
+        self._find_timestamps = None
+
+        super().__init__(header["topic_id"])
+        self.nbytes = len(buffer)
+        self.raw_nbytes = header["raw_nbytes"] + header_start + header_len
+        self.count = header["count"]
+        self.min_ts = header["min_ts"]
+        self.max_ts = header["max_ts"]
+        self.compressed = any(
+            i.get("encoding") for i in self._sections())
+
+        if not self.compressed:
+            self.timestamps = self._view(header["timestamps"], 'q')
+            for field, column_d in header["columns"].items():
+                self.columns[field] = self._column(column_d)
+
+    def _sections(self):
+        yield self._header["timestamps"]
+        for column_d in self._header["columns"].values():
+            if "values" in column_d:
+                yield column_d["values"]
+
+    def _view(self, section, format_=None):
+        section_b = self._data[
+            section["offset"]:section["offset"] + section["nbytes"]]
+        return section_b.cast(format_) if format_ else section_b
+
+    def _typed(self, section, typecode):
+        if section.get("encoding"):
+            return DECODERS[typecode](self._view(section), self.count)
+        values = array(typecode)
+        values.frombytes(self._view(section))
+        return values
+
+    def _column(self, column_d):
+        if "json" in column_d:
+            return _JsonColumn(self._view(column_d["json"]))
+
+        missing = column_d.get("missing")
+        return Column(
+            self._view(column_d["values"], column_d["typecode"]),
+            self._view(missing, 'b') if missing else None)
+
+    def __len__(self):
+        return self.count
+
+    def put(self, i, found, timestamp_us, values):
+        raise RuntimeError('Segments are read-only.')
+
+    def find(self, timestamp_us):
+        '''Find position for timestamp without decoding the values
+
+        See TopicData.find
+        '''
+        if not self.compressed:
+            return super().find(timestamp_us)
+        if not self.min_ts <= timestamp_us <= self.max_ts:
+            return (0 if timestamp_us < self.min_ts else self.count), False
+
+        if self._find_timestamps is None:
+            self._find_timestamps = self._typed(
+                self._header["timestamps"], 'q')
+        i = bisect_left(self._find_timestamps, timestamp_us)
+        return i, self._find_timestamps[i] == timestamp_us
+
+    def block(self):
+        '''Get data of the segment for reading
+
+        Returns:
+            The segment itself when it is uncompressed or decoded TopicData
+        '''
+        if not self.compressed:
+            return self
+        return self.to_topic_data()
+
+    def to_topic_data(self):
+        '''Load segment to mutable TopicData
+        '''
+        topic_data = TopicData(self.topic_id)
+        topic_data.timestamps = self._typed(self._header["timestamps"], 'q')
+        for field, column_d in self._header["columns"].items():
+            if "json" in column_d:
+                column = _JsonColumn(self._view(column_d["json"]))
+                topic_data.columns[field] = column.to_column()
+                continue
+
+            missing = None
+            if "missing" in column_d:
+                missing = array('b')
+                missing.frombytes(self._view(column_d["missing"]))
+            topic_data.columns[field] = Column(
+                self._typed(column_d["values"], column_d["typecode"]),
+                missing)
+        return topic_data
+
+    def close(self):
+        '''Release the memory-map of the segment
+        '''
+        self.timestamps = array('q')
+        self.columns = {}
+        self._find_timestamps = None
+        self._data = None
+        if not self._mmap:
+            return
+        try:
+            self._mmap.close()
+        except BufferError:  # pragma: no cover
+            # Views still in use; mapping is released when they are freed.
+            pass
+
+    def remove(self):
+        '''Close the segment and remove its file
+        '''
+        self.close()
+        if self.path:
+            os.remove(self.path)
+
+
+class TopicStore:
+    '''Data of a single topic split into sealed segments and hot data
+
+    New data is written to in-memory TopicData. The hot data is sealed into
+    a segment after it has segment_size data points, when segment_dir or
+    compression is given. With segment_dir the segments are written to
+    files, otherwise they are kept in memory. Segments cover consecutive
+    time ranges and hot data only contains data newer than the newest
+    segment. Late data for the time range of a segment is written by
+    rewriting the segment.
+
+    Methods of the store are not thread-safe. Callers must hold lock of the
+    store while accessing it.
+    '''
+
+    def __init__(
+            self,
+            topic_id,
+            segment_dir=None,
+            segment_size=None,
+            compression=None,
+            quantile_accuracy=None):
+        self.topic_id = topic_id
+        self.hot = TopicData(topic_id)
+        self.segments = []
+        self.rollups = Rollups(
+            accuracy=float(quantile_accuracy) if quantile_accuracy else None)
+        self.lock = RLock()
+        self._segment_size = int(segment_size) if segment_size else None
+        self._compression = compression or None
+        self._dir = None
+
+        self.writes = 0
+        self.floor_us = None
+        self._max_age_us = None
+        self._max_points = None
+        self._writes_since_eviction = 0
+
+        if segment_dir:
+            self._dir = join(expanduser(segment_dir), quote(topic_id, safe=''))
+            self._load_segments()
+
+    def _load_segments(self):
+        if not exists(self._dir):
+            return
+
+        for filename in os.listdir(self._dir):
+            if filename.endswith('.seg'):
+                self.segments.append(Segment(join(self._dir, filename)))
+        self.segments.sort(key=lambda segment: segment.min_ts)
+
+        for segment in self.segments:
+            block = segment.block()
+            for i, timestamp_us in enumerate(block.timestamps):
+                self.rollups.add(timestamp_us, block.values_at(i))
+
+    def __len__(self):
+        return sum(len(i) for i in self.segments) + len(self.hot)
+
+    @property
+    def persistent_segments(self):
+        '''True if the segments are stored in files
+        '''
+        return bool(self._dir)
+
+    def _write_segment(self, topic_data):
+        data = encode_segment(topic_data, self._compression)
+        if not self._dir:
+            return Segment(buffer=data)
+
+        os.makedirs(self._dir, exist_ok=True)
+        path = join(self._dir, f'{uuid4().hex}.seg')
+        write_segment(path, data)
+        return Segment(path)
+
+    def _segment_i(self, timestamp_us):
+        # Index of the segment that has or should have the timestamp or None
+        # if the timestamp belongs to the hot data.
+        if not self.segments or timestamp_us > self.segments[-1].max_ts:
+            return None
+        mins = [i.min_ts for i in self.segments]
+        return max(bisect_right(mins, timestamp_us) - 1, 0)
+
+    def contains(self, timestamp_us):
+        '''Check if topic has data for given timestamp
+        '''
+        if self.floor_us is not None and timestamp_us < self.floor_us:
+            return False
+        k = self._segment_i(timestamp_us)
+        topic_data = self.hot if k is None else self.segments[k]
+        return topic_data.find(timestamp_us)[1]
+
+    def expired(self, timestamp_us):
+        '''Check if timestamp is older than the retention floor
+        '''
+        floor_us = self._floor()
+        return floor_us is not None and timestamp_us < floor_us
+
+    def put(self, timestamp_us, values):
+        '''Insert data point or replace data point with same timestamp
+
+        Data points older than the retention floor, e.g., replayed from the
+        data log, are ignored.
+
+        Args:
+            timestamp_us: Timestamp as microseconds since epoch
+            values: Dict of field values
+        '''
+        if self.floor_us is not None and timestamp_us < self.floor_us:
+            return
+        self.writes += 1
+        k = self._segment_i(timestamp_us)
+        if k is None:
+            i, found = self.hot.find(timestamp_us)
+            self.hot.put(i, found, timestamp_us, values)
+            self.rollups.add(timestamp_us, values, replaced=found)
+            if self._segment_size and len(self.hot) >= self._segment_size:
+                self.seal()
+            return
+
+        segment = self.segments[k]
+        i, found = segment.find(timestamp_us)
+        if found:
+            block = segment.block()
+            if block.values_at(i) == {
+                    field: values.get(field) for field in block.columns}:
+                return
+
+        topic_data = segment.to_topic_data()
+        topic_data.put(i, found, timestamp_us, values)
+        self.rollups.add(timestamp_us, values, replaced=found)
+        self.segments[k] = self._write_segment(topic_data)
+        segment.remove()
+
+    def seal(self):
+        '''Write hot data into a new segment
+        '''
+        if not (self._dir or self._compression) or not len(self.hot):
+            return
+
+        self.segments.append(self._write_segment(self.hot))
+        self.hot = TopicData(self.topic_id)
+
+    def rows(
+            self,
+            since_us=None,
+            until_us=None,
+            limit=None,
+            fields=None,
+            oldest=False):
+        '''Build data dicts of data matching the filters
+
+        Only the segments overlapping the requested time range are read.
+
+        Args:
+            oldest: Take limit oldest data points instead of the newest
+
+        Returns:
+            List of data dicts with timestamps as ISO 8601 strings
+        '''
+        since_us = self.visible_since(since_us)
+        parts = self._parts(since_us, until_us)
+        if not oldest:
+            parts.reverse()
+
+        ranges = []
+        remaining = limit
+        for part in parts:
+            if limit and not remaining:
+                break
+            block = part.block()
+            start, end = block.range(since_us, until_us, remaining, oldest)
+            if limit:
+                remaining -= end - start
+            ranges.append((block, start, end))
+
+        if not oldest:
+            ranges.reverse()
+
+        ret = []
+        for block, start, end in ranges:
+            ret.extend(block.rows(start, end, fields or []))
+        return ret
+
+    def _parts(self, since_us=None, until_us=None):
+        return [
+            i for i in self.segments if (
+                since_us is None or i.max_ts >= since_us) and (
+                until_us is None or i.min_ts <= until_us)] + [self.hot]
+
+    def visible_since(self, since_us=None):
+        '''Get since_us limited to the retention floor
+        '''
+        floor_us = self._floor(self._max_points)
+        if floor_us is None:
+            return since_us
+        return floor_us if since_us is None else max(since_us, floor_us)
+
+    def bounds(self, since_us=None, until_us=None):
+        '''Get timestamps of the first and the last data point in time range
+
+        Returns:
+            (first, last) tuple of timestamps or None if there is no data
+        '''
+        since_us = self.visible_since(since_us)
+        blocks = [i.block() for i in self._parts(since_us, until_us)]
+        ranges = [(i, *i.range(since_us, until_us)) for i in blocks]
+        timestamps = [
+            (block.timestamps[start], block.timestamps[end - 1])
+            for block, start, end in ranges if start < end]
+        if not timestamps:
+            return None
+        return timestamps[0][0], timestamps[-1][1]
+
+    def summarize(self, since_us, until_us):
+        '''Summarize data in time range from raw data
+
+        Returns:
+            Bucket with the statistics of the data
+        '''
+        bucket = Bucket(self.rollups.accuracy)
+        for part in self._parts(since_us, until_us):
+            block = part.block()
+            start, end = block.range(since_us, until_us)
+            for i in range(start, end):
+                bucket.add(block.timestamps[i], block.values_at(i))
+        return bucket
+
+    def set_retention(self, max_age_us=None, max_points=None):
+        '''Set retention policy of the topic
+
+        Args:
+            max_age_us: Maximum age of data points in microseconds
+            max_points: Maximum number of data points
+        '''
+        self._max_age_us = int(max_age_us) if max_age_us else None
+        self._max_points = int(max_points) if max_points else None
+
+    def _points_floor(self, max_points):
+        # Timestamp of the oldest of the max_points newest data points
+        newer = 0
+        for part in reversed(self.segments + [self.hot]):
+            if newer + len(part) >= max_points:
+                i = len(part) - (max_points - newer)
+                if isinstance(part, Segment) and i == 0:
+                    return part.min_ts
+                return part.block().timestamps[i]
+            newer += len(part)
+        return None
+
+    def _floor(self, max_points=None):
+        floors = [self.floor_us]
+        if self._max_age_us:
+            floors.append(timestamp_to_us(datetime.utcnow()) -
+                          self._max_age_us)
+        if max_points:
+            floors.append(self._points_floor(max_points))
+
+        floors = [i for i in floors if i is not None]
+        return max(floors) if floors else None
+
+    def evict(self):
+        '''Evict data points according to the retention policy
+
+        Data points older than the retention floor are hidden immediately.
+        Segments are removed once all of their data points are evicted and
+        the hot data is compacted in batches.
+        '''
+        max_points = self._max_points
+        if max_points and len(self.hot) < max_points:
+            # Finding the floor from segments may need decoding, so it is
+            # only updated after a batch of writes.
+            self._writes_since_eviction += 1
+            if self._writes_since_eviction < max(max_points // 16, 1):
+                max_points = None
+            else:
+                self._writes_since_eviction = 0
+
+        self.floor_us = self._floor(max_points)
+        if self.floor_us is None:
+            return
+        self.rollups.evict(self.floor_us)
+
+        while self.segments and self.segments[0].max_ts < self.floor_us:
+            self.segments.pop(0).remove()
+
+        if self.segments:
+            return
+
+        dead = self.hot.range(until_us=self.floor_us - 1)[1]
+        if dead and dead >= len(self.hot) // 2:
+            self.hot.drop_head(dead)
+
+    @property
+    def version(self):
+        '''Version that changes whenever data is written or evicted
+
+        The retention floor is only moved by evict(), so data points that
+        age past max_age do not change the version until the next eviction.
+        '''
+        return self.writes, self.floor_us
+
+    def stats(self):
+        '''Get storage statistics of the topic
+
+        Returns:
+            Dict with number of data points and sizes of the segments
+        '''
+        nbytes = sum(i.nbytes for i in self.segments)
+        raw_nbytes = sum(i.raw_nbytes for i in self.segments)
+        return dict(
+            num_points=len(self),
+            num_hot_points=len(self.hot),
+            num_segments=len(self.segments),
+            segment_bytes=nbytes,
+            raw_segment_bytes=raw_nbytes,
+            compression_ratio=raw_nbytes / nbytes if nbytes else None)
+
+    def snapshot_parts(self):
+        '''Get data that is not persisted in segment files
+
+        Returns:
+            List of objects with block method returning TopicData. The
+            objects are not affected by later writes.
+        '''
+        parts = [self.hot.copy()]
+        if not self._dir:
+            parts = self.segments + parts
+        return parts
+
+    def close(self):
+        '''Release memory-maps of the segments
+        '''
+        for segment in self.segments:
+            segment.close()
@@ -0,0 +1,282 @@
+'''Columnar in-memory storage used by DictConnection
+'''
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+
+from fdbk.utils import timestamp_as_str
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+INT64_MIN = -2**63
+INT64_MAX = 2**63 - 1
+# Largest magnitude of ints that can be stored in a float column exactly
+FLOAT_INT_MAX = 2**53
+
+
+def timestamp_to_us(timestamp):
+    '''Convert datetime to microseconds since epoch
+
+    Naive datetimes are considered to be in UTC.
+
+    Args:
+        timestamp: Datetime to convert
+
+    Returns:
+        Microseconds since epoch as int
+    '''
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp - EPOCH) // MICROSECOND
+
+
+def us_to_timestamp(timestamp_us):
+    '''Convert microseconds since epoch to naive UTC datetime
+
+    Args:
+        timestamp_us: Microseconds since epoch
+
+    Returns:
+        Naive datetime in UTC
+    '''
+    return EPOCH + timedelta(microseconds=timestamp_us)
+
+
+def _typecode(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int) and INT64_MIN <= value <= INT64_MAX:
+        return 'q'
+    if isinstance(value, float):
+        return 'd'
+    return None
+
+
+class Column:
+    '''Single field of topic data
+
+    Ints are stored in an int64 array and floats in a double array. Int
+    columns are promoted to float columns when a float is added and ints
+    fit in the float without loss of precision. Missing values (None) in
+    typed columns are tracked in a mask that is only allocated when needed.
+    Other values make the column fall back to a list of objects.
+    '''
+
+    def __init__(self, values=None, missing=None):
+        self.values = values if values is not None else array('q')
+        self.missing = missing
+
+    @classmethod
+    def empty(cls, length):
+        '''Create column with given number of missing values
+        '''
+        if not length:
+            return cls()
+        return cls(array('q', bytes(8 * length)), array('b', [1] * length))
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def typecode(self):
+        if isinstance(self.values, list):
+            return None
+        return self.values.typecode
+
+    def _as_list(self):
+        self.values = self[:]
+        self.missing = None
+
+    def _as_float(self):
+        self.values = array('d', self.values)
+
+    def _prepare(self, value):
+        # Changes the column type so that the value can be stored
+        typecode = self.typecode
+        if typecode is None:
+            return value
+        if value is None:
+            if self.missing is None:
+                self.missing = array('b', bytes(len(self.values)))
+            return 0
+
+        value_typecode = _typecode(value)
+        if value_typecode == typecode:
+            return value
+        if typecode == 'd' and value_typecode == 'q' and (
+                abs(value) <= FLOAT_INT_MAX):
+            return float(value)
+        if typecode == 'q' and value_typecode == 'd' and all(
+                abs(i) <= FLOAT_INT_MAX for i in self.values):
+            self._as_float()
+            return value
+
+        self._as_list()
+        return value
+
+    def insert(self, i, value):
+        stored = self._prepare(value)
+        self.values.insert(i, stored)
+        if self.missing is not None:
+            self.missing.insert(i, value is None)
+
+    def set(self, i, value):
+        stored = self._prepare(value)
+        self.values[i] = stored
+        if self.missing is not None:
+            self.missing[i] = value is None
+
+    def __getitem__(self, key):
+        values = self.values[key]
+        if isinstance(self.values, list):
+            return values
+        values = values.tolist()
+        if self.missing is None:
+            return values
+
+        return [
+            None if missing else value for value, missing in zip(
+                values, self.missing[key])]
+
+    def drop_head(self, n):
+        del self.values[:n]
+        if self.missing is not None:
+            del self.missing[:n]
+
+    def copy(self):
+        return Column(
+            self.values[:],
+            self.missing[:] if self.missing is not None else None)
+
+
+class TopicData:
+    '''Columnar storage for data of a single topic
+
+    Timestamps are stored as microseconds since epoch in an int64 array and
+    kept sorted. Each field is stored in its own Column. Data dicts are only
+    built when the data is read.
+    '''
+
+    def __init__(self, topic_id):
+        self.topic_id = topic_id
+        self.timestamps = array('q')
+        self.columns = {}
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def find(self, timestamp_us):
+        '''Find position for timestamp
+
+        Returns:
+            (index, found) tuple where index is the position of the timestamp
+            or the position where it should be inserted to keep data sorted.
+        '''
+        timestamps = self.timestamps
+        if not timestamps or timestamps[-1] < timestamp_us:
+            return len(timestamps), False
+
+        i = bisect_left(timestamps, timestamp_us)
+        return i, timestamps[i] == timestamp_us
+
+    def range(self, since_us=None, until_us=None, limit=None, oldest=False):
+        '''Get (start, end) index range matching the filters
+
+        Limit takes the newest data points or the oldest when oldest is True.
+        '''
+        timestamps = self.timestamps
+
+        start = 0
+        if since_us is not None:
+            start = bisect_left(timestamps, since_us)
+        end = len(timestamps)
+        if until_us is not None:
+            end = bisect_right(timestamps, until_us)
+
+        if limit and oldest:
+            end = min(end, start + limit)
+        elif limit:
+            start = max(start, end - limit)
+
+        return start, max(start, end)
+
+    def put(self, i, found, timestamp_us, values):
+        '''Insert or replace data point at given index
+
+        Args:
+            i: Index returned by find
+            found: Boolean returned by find
+            timestamp_us: Timestamp as microseconds since epoch
+            values: Dict of field values
+        '''
+        for field in values:
+            if field not in self.columns:
+                self.columns[field] = Column.empty(len(self))
+
+        for field, column in self.columns.items():
+            if found:
+                column.set(i, values.get(field))
+            else:
+                column.insert(i, values.get(field))
+
+        if not found:
+            self.timestamps.insert(i, timestamp_us)
+
+    def drop_head(self, n):
+        '''Remove n oldest data points
+        '''
+        del self.timestamps[:n]
+        for column in self.columns.values():
+            column.drop_head(n)
+
+    def block(self):
+        '''Get data for reading, see Segment.block
+        '''
+        return self
+
+    def values_at(self, i):
+        '''Get dict of field values of data point at given index
+        '''
+        return {
+            field: column[i:i + 1][0] for field, column in
+            self.columns.items()}
+
+    def rows(self, start, end, fields):
+        '''Build data dicts for given index range
+
+        Args:
+            start: Index of the first row
+            end: Index after the last row
+            fields: Fields to include in the rows
+
+        Returns:
+            List of data dicts with timestamps as ISO 8601 strings
+        '''
+        columns = [
+            (field, self.columns[field][start:end]) for field in fields
+            if field in self.columns]
+        missing = [field for field in fields if field not in self.columns]
+
+        ret = []
+        for j, timestamp_us in enumerate(self.timestamps[start:end]):
+            row = {
+                "topic_id": self.topic_id,
+                "timestamp": timestamp_as_str(us_to_timestamp(timestamp_us))
+            }
+            for field, column in columns:
+                row[field] = column[j]
+            for field in missing:
+                row[field] = None
+            ret.append(row)
+        return ret
+
+    def copy(self):
+        '''Copy of the data that is not affected by later writes
+        '''
+        topic_data = TopicData(self.topic_id)
+        topic_data.timestamps = self.timestamps[:]
+        topic_data.columns = {
+            field: column.copy() for field, column in self.columns.items()}
+        return topic_data
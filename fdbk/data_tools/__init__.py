@@ -6,5 +6,6 @@ Functions to ease the simple data analysis done by the DBConnection.
 
 from .functions import *
 from ._aggregate import *
+from ._plan import *
 from ._process import *
 from ._run import *
@@ -1,4 +1,6 @@
-from datetime import timezone
+from datetime import datetime, timedelta, timezone
+from numbers import Number
+
 from dateutil.parser import isoparse
 
 from fdbk.utils import timestamp_as_str
@@ -6,7 +8,11 @@ from fdbk.utils.messages import (
     method_not_supported,
     no_data)
 
-from .functions import functions as data_functions, VALUE_FUNCS
+from .functions import functions as data_functions, NUMBER_FUNCS, VALUE_FUNCS
+from .functions._backend import aggregate_arrays, array_windows, use_numpy
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
 
 
 def _dt_timestamp(data_point):
@@ -17,13 +23,100 @@ def _as_naive_utc(dt_timestamp):
     return dt_timestamp.astimezone(timezone.utc).replace(tzinfo=None)
 
 
+def _parse_us(timestamp):
+    # Timestamps formatted with timestamp_as_str are parsed without dateutil
+    if len(timestamp) in (20, 27) and timestamp[10] == 'T' and (
+            timestamp[-1] == 'Z'):
+        try:
+            return (datetime(
+                int(timestamp[0:4]),
+                int(timestamp[5:7]),
+                int(timestamp[8:10]),
+                int(timestamp[11:13]),
+                int(timestamp[14:16]),
+                int(timestamp[17:19]),
+                int(timestamp[20:26] or 0)) - _EPOCH) // _MICROSECOND
+        except ValueError:
+            pass
+
+    dt_timestamp = isoparse(timestamp)
+    if dt_timestamp.tzinfo is not None:
+        dt_timestamp = _as_naive_utc(dt_timestamp)
+    return (dt_timestamp - _EPOCH) // _MICROSECOND
+
+
 def _get_keys(data_point):
     return [key for key in data_point if key != 'timestamp']
 
 
+def _get_windows(data, aggregate_to, window_us):
+    # Splits data in time order to (window index, start, end) ranges with a
+    # single pass. Data point belongs to the first window that ends at or
+    # after it. Last non-empty window is merged to the last window and data
+    # after the last window is left out.
+    start_us = _parse_us(data[0].get('timestamp'))
+    windows = []
+    for j, data_point in enumerate(data):
+        offset = _parse_us(data_point.get('timestamp')) - start_us
+        if offset <= 0:
+            i = 0
+        elif window_us:
+            i = max(-(-offset // window_us) - 1, 0)
+        else:
+            i = aggregate_to
+        if i >= aggregate_to:
+            break
+
+        if windows and windows[-1][0] == i:
+            windows[-1][2] = j + 1
+        else:
+            windows.append([i, j, j + 1])
+
+    if windows[-1][2] == len(data):
+        windows[-1][0] = aggregate_to - 1
+    return windows
+
+
+def _aggregate_values(data_points, keys, aggregate_with):
+    function = NUMBER_FUNCS.get(aggregate_with)
+    if not function:
+        values = {}
+        for key in keys:
+            try:
+                values[key] = data_functions[aggregate_with](
+                    data_points, key, None).get('payload').get('value')
+            except BaseException:
+                values[key] = None
+        return values
+
+    numbers = {key: [] for key in keys}
+    missing = set()
+    for data_point in data_points:
+        for key, key_numbers in numbers.items():
+            try:
+                value = data_point[key]
+            except KeyError:
+                missing.add(key)
+                continue
+            if isinstance(value, Number):
+                key_numbers.append(value)
+
+    values = {}
+    for key, key_numbers in numbers.items():
+        try:
+            values[key] = function(key_numbers) if (
+                key_numbers and key not in missing) else None
+        except BaseException:
+            values[key] = None
+    return values
+
+
 def aggregate(data, aggregate_to, aggregate_with=None, aggregate_always=False):
     '''Aggregate data to less data points
 
+    Data is aggregated in a single pass, so it must be in time order like
+    the data returned by the DB connections.
+
     Args:
         data: Data before aggregation
         aggregate_to: Number of data points to aggregate data to.
@@ -57,31 +150,27 @@ def aggregate(data, aggregate_to, aggregate_with=None, aggregate_always=False):
     window = (end - start) / aggregate_to
 
     keys = _get_keys(data[0])
-    remaining = data
-    for i in range(aggregate_to):
-        try:
-            last = next(j for j, a in enumerate(remaining)
-                        if _dt_timestamp(a) > start + (i + 1) * window)
-            current = remaining[:last]
-            if not current:
-                continue
-            remaining = remaining[last:]
-        except StopIteration:
-            if i == (aggregate_to - 1):
-                current = remaining
-            else:
-                continue
-
+    windows = values = None
+    if use_numpy():
+        windows = array_windows(
+            [i.get('timestamp') for i in data],
+            aggregate_to,
+            window // _MICROSECOND)
+    if not windows:
+        windows = _get_windows(data, aggregate_to, window // _MICROSECOND)
+    if use_numpy():
+        values = aggregate_arrays(data, keys, windows, aggregate_with)
+    if not values:
+        values = [
+            _aggregate_values(data[first:last], keys, aggregate_with)
+            for _, first, last in windows]
+
+    for (i, _, _), window_values in zip(windows, values):
         aggregated_point = dict(
             timestamp=timestamp_as_str(
                 _as_naive_utc(
                     start + i * window)))
-        for key in keys:
-            try:
-                aggregated_point[key] = data_functions[aggregate_with](
-                    current, key, None).get('payload').get('value')
-            except BaseException:
-                aggregated_point[key] = None
+        aggregated_point.update(window_values)
         aggregated.append(aggregated_point)
 
     return (aggregated, warnings,)
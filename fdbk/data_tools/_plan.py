@@ -0,0 +1,114 @@
+from collections import namedtuple, OrderedDict
+from copy import deepcopy
+import json
+from threading import Lock
+
+from fdbk.utils.messages import (
+    method_not_supported,
+    field_is_undefined)
+
+from .functions import (
+    compile_function, functions as data_functions, CHART_FUNCS)
+
+PLAN_CACHE_SIZE = 256
+
+DataToolStep = namedtuple('DataToolStep', (
+    'field',
+    'method',
+    'function',
+    'error',
+    'is_chart',
+    'unit',
+    'metadata',
+))
+DataToolPlan = namedtuple('DataToolPlan', ('topic_name', 'steps'))
+
+_plans = OrderedDict()
+_plans_lock = Lock()
+
+
+def _check_data_tool(data_tool, topic_d):
+    if data_tool["method"] not in data_functions:
+        raise ValueError(method_not_supported(data_tool["method"]))
+    if data_tool["field"] not in topic_d["fields"]:
+        raise ValueError(field_is_undefined(data_tool["field"]))
+
+
+def _compile_step(instruction, topic_d, units):
+    # Plans are shared, so they must not refer to the dicts of the caller
+    instruction = deepcopy(instruction)
+    try:
+        _check_data_tool(instruction, topic_d)
+    except ValueError as error:
+        return DataToolStep(
+            instruction["field"],
+            instruction["method"],
+            None,
+            str(error),
+            False,
+            None,
+            None)
+
+    return DataToolStep(
+        instruction["field"],
+        instruction["method"],
+        compile_function(
+            instruction["method"], instruction.get("parameters")),
+        None,
+        instruction["method"] in CHART_FUNCS,
+        units.get(instruction["field"]),
+        instruction.get("metadata"))
+
+
+def compile_plan(topic_d):
+    '''Compile data tools of the topic to a plan
+
+    Data tool instructions are checked, functions and units resolved and
+    parameters of status, warning and collection data tools parsed once.
+
+    Args:
+        topic_d: Topic of which data tools to compile
+
+    Returns:
+        DataToolPlan with a DataToolStep for each data tool
+    '''
+    units = {}
+    for unit in topic_d.get("units", []):
+        units.setdefault(unit["field"], unit["unit"])
+
+    return DataToolPlan(topic_d["name"], tuple(
+        _compile_step(instruction, topic_d, units)
+        for instruction in topic_d["data_tools"]))
+
+
+def get_plan(topic_d):
+    '''Get compiled data tools of the topic
+
+    Plans are cached by the content of the topic, so topics with the same
+    name, fields, units and data tools share a plan.
+
+    Args:
+        topic_d: Topic of which data tools to get
+
+    Returns:
+        DataToolPlan of the topic
+    '''
+    key = json.dumps([
+        topic_d["name"],
+        topic_d["fields"],
+        topic_d.get("units"),
+        topic_d["data_tools"],
+    ], sort_keys=True, default=repr)
+
+    with _plans_lock:
+        plan = _plans.get(key)
+        if plan:
+            _plans.move_to_end(key)
+            return plan
+
+    plan = compile_plan(topic_d)
+    with _plans_lock:
+        _plans[key] = plan
+        while len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    return plan
@@ -1,6 +1,8 @@
-from fdbk.utils.messages import collection_name_is_undefined
+from fdbk.utils.messages import (
+    collection_name_is_undefined, sketches_not_combined)
 
-from .functions.utils import chart_dict, statistics_dict
+from .functions import QuantileSketch
+from .functions.utils import chart_dict, statistics_dict, value_dict
 
 
 def _create_chart(type_, field):
@@ -59,6 +61,75 @@ def process_charts(statistics):
     return (result, [],)
 
 
+def _combine_sketches(items):
+    payloads = [payload for payload, _ in items]
+    sketch = QuantileSketch.from_dict(items[0][1])
+    for _, sketch_d in items[1:]:
+        sketch.merge(QuantileSketch.from_dict(sketch_d))
+
+    topic_names = list(dict.fromkeys(i.get("topic_name") for i in payloads))
+    combined = dict(
+        type=payloads[0].get("type"),
+        field=payloads[0].get("field"),
+        value=sketch.quantile(payloads[0].get("percentile") / 100),
+        percentile=payloads[0].get("percentile"),
+        topic_name=", ".join(str(i) for i in topic_names),
+        topic_names=topic_names)
+
+    units = set(i.get("unit") for i in payloads)
+    if len(units) == 1 and None not in units:
+        combined["unit"] = units.pop()
+    return value_dict(**combined)
+
+
+def process_sketches(statistics):
+    '''Combine percentiles of same field and type from multiple topics
+
+    Quantile sketches of the percentile values are merged, so the combined
+    percentile is estimated from the data of all of the topics.
+
+    Args:
+        statistics: Iterable of statistics
+
+    Returns:
+        List of statistics where sketches are removed from the values and a
+        combined value is added for each field and type of percentiles with
+        sketches from multiple topics, and warnings of percentiles that could
+        not be combined as (results, warnings,) tuple
+    '''
+    sketches = {}
+    result = []
+    warnings = []
+
+    for i in statistics:
+        if not i:
+            continue
+        result.append(i)
+        if i.get("type") != "value":
+            continue
+
+        payload = i.get("payload", {})
+        sketch_d = payload.pop("sketch", None)
+        if not sketch_d:
+            continue
+
+        key = (
+            payload.get('field'),
+            payload.get('type'),
+            payload.get('percentile'))
+        sketches.setdefault(key, []).append((payload, sketch_d))
+
+    for (field, method, _), items in sketches.items():
+        if len(items) < 2:
+            continue
+        try:
+            result.append(_combine_sketches(items))
+        except ValueError:
+            warnings.append(sketches_not_combined(field, method))
+
+    return (result, warnings,)
+
+
 def _create_collection(name, **kwargs):
     return dict(name=name, **kwargs, data=[])
 
@@ -216,6 +287,7 @@ def post_process(statistics):
         Post-processed results and warnings as (results, warnings,) tuple
     '''
     funcs = (
+        process_sketches,
         process_charts,
         process_collections,
     )
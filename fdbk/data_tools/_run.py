@@ -1,10 +1,10 @@
-from fdbk.utils.messages import (
-    method_not_supported,
-    field_is_undefined,
-    no_data)
+from copy import deepcopy
 
-from .functions import functions as data_functions, CHART_FUNCS
+from fdbk.utils.messages import no_data
+
+from .functions.utils import CachedData
 from ._aggregate import aggregate
+from ._plan import get_plan
 from ._process import pre_process, post_process
 
 
@@ -23,27 +23,15 @@ def _get_warnings_from_metadata(statistic):
     return list(warnings)
 
 
-def _check_data_tool(data_tool, topic_d):
-    if data_tool["method"] not in data_functions:
-        raise ValueError(method_not_supported(data_tool["method"]))
-    if data_tool["field"] not in topic_d["fields"]:
-        raise ValueError(field_is_undefined(data_tool["field"]))
-
-
-def _add_topic_and_metadata(statistic, topic_d, instruction):
+def _add_topic_and_metadata(statistic, plan, step):
     if not statistic:
         return
 
-    statistic["payload"]["topic_name"] = topic_d["name"]
-    if instruction.get("metadata"):
-        statistic["metadata"] = instruction.get("metadata")
-    try:
-        statistic["payload"]["unit"] = next(
-            i["unit"] for i in topic_d["units"] if (
-                i["field"] == instruction["field"])
-        )
-    except StopIteration:
-        pass
+    statistic["payload"]["topic_name"] = plan.topic_name
+    if step.metadata:
+        statistic["metadata"] = deepcopy(step.metadata)
+    if step.unit is not None:
+        statistic["payload"]["unit"] = step.unit
 
 
 def run_data_tools(
@@ -51,7 +39,10 @@ def run_data_tools(
         data,
         aggregate_to=None,
         aggregate_with=None,
-        aggregate_always=False):
+        aggregate_always=False,
+        aggregated=None,
+        values=None,
+        sketches=False):
     '''Run data tools of topic for given data
 
     Args:
@@ -61,6 +52,15 @@ def run_data_tools(
         aggregate_with: Aggregate data with speficied function
         aggregate_always: Aggregate data even if datas length is
             shorter than aggregate_to value. Disabled by default.
+        aggregated: Already aggregated data to use for charts instead of
+            aggregating data. Data can be None when only chart data tools
+            are run.
+        values: Already computed results of value data tools as dict keyed
+            by (field, method) tuples. Data can be None when all of the other
+            data tools are charts run with aggregated data.
+        sketches: Include quantile sketches in percentile results, so that
+            the percentiles can be combined with the results of other runs.
+            Disabled by default.
 
     Returns:
         Pre-processed results and warnings as (results, warnings,) tuple
@@ -68,38 +68,41 @@ def run_data_tools(
     results = []
     warnings = []
 
-    if not data:
+    if not data and not aggregated and not values:
         warnings.append(no_data(topic_d))
         return ([], warnings,)
 
-    if aggregate_to:
+    if aggregated:
+        chart_data = aggregated
+    elif aggregate_to and data:
         chart_data, aggregate_warnings = aggregate(
             data, aggregate_to, aggregate_with, aggregate_always)
         warnings.extend(aggregate_warnings)
     else:
         chart_data = data
 
-    for instruction in topic_d['data_tools']:
-        try:
-            _check_data_tool(instruction, topic_d)
-        except ValueError as error:
-            warnings.append(str(error))
-            continue
+    # Data tools of the same field share the extracted values and results
+    if data:
+        data = CachedData(data, sketches)
 
-        is_chart = instruction["method"] in CHART_FUNCS
+    plan = get_plan(topic_d)
+    for step in plan.steps:
+        if step.error:
+            warnings.append(step.error)
+            continue
 
         try:
-            result = data_functions[instruction.get("method")](
-                data if not is_chart else chart_data,
-                instruction.get("field"),
-                instruction.get("parameters")
-            )
+            if values and (step.field, step.method) in values:
+                result = deepcopy(values[(step.field, step.method)])
+            else:
+                result = step.function(
+                    data if not step.is_chart else chart_data, step.field)
         except (AssertionError, ValueError) as error:
             warnings.append(str(error))
             result = None
 
         warnings.extend(_get_warnings_from_metadata(result))
-        _add_topic_and_metadata(result, topic_d, instruction)
+        _add_topic_and_metadata(result, plan, step)
         results.append(result)
 
     results, pre_warnings = pre_process(results)
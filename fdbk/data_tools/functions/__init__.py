@@ -1,7 +1,36 @@
+from ._backend import get_backend, set_backend
 from ._chart_funcs import *
 from ._collection_funcs import *
+from ._sketch import QuantileSketch
 from ._status_funcs import *
 from ._value_funcs import *
 
 # pylint: disable=invalid-name
 functions = {**CHART_FUNCS, **COLLECTION_FUNCS, **STATUS_FUNCS, **VALUE_FUNCS}
+compilers = {**COLLECTION_COMPILERS, **STATUS_COMPILERS}
+
+
+def compile_function(method, parameters=None):
+    '''Get data tool function with parameters bound to it
+
+    Parameters of status, warning and collection data tools are parsed
+    once when the function is compiled.
+
+    Args:
+        method: Name of the data tool function
+        parameters: Parameters of the data tool
+
+    Returns:
+        Function that takes data and field as arguments
+
+    Raises:
+        KeyError: Function is not supported
+    '''
+    if method in compilers:
+        return compilers[method](parameters)
+
+    function = functions[method]
+
+    def run_function(data, field):
+        return function(data, field, parameters)
+    return run_function
@@ -0,0 +1,233 @@
+'''Optional NumPy backend of the data tools
+
+Value data tools and aggregation use NumPy arrays when NumPy is installed.
+Ints are computed exactly in int64 arrays and floats in float64 arrays, so
+results match the pure Python implementation within float tolerance. Ints
+mixed with floats are tracked with a mask, so results that are ints in the
+pure Python implementation are ints here too. Other numbers, e.g., bools
+or ints that do not fit int64, are computed with the pure Python
+implementation.
+'''
+
+from numbers import Number
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+BACKENDS = ('numpy', 'python')
+# Largest magnitude of ints that can be stored in a float array exactly
+FLOAT_INT_MAX = 2**53
+INT64_MAX = 2**63 - 1
+
+_MISSING = object()
+_backend = dict(name='numpy' if np else 'python')
+
+
+def get_backend():
+    '''Get name of the backend used to run the data tools
+
+    Returns:
+        "numpy" or "python"
+    '''
+    return _backend["name"]
+
+
+def set_backend(name):
+    '''Select backend used to run the data tools
+
+    NumPy backend is used by default when NumPy is installed.
+
+    Args:
+        name: "numpy" or "python"
+
+    Raises:
+        ValueError: Backend is not supported or NumPy is not installed
+    '''
+    if name not in BACKENDS or (name == 'numpy' and not np):
+        raise ValueError(f'Data tools backend "{name}" is not available')
+    _backend["name"] = name
+
+
+def use_numpy():
+    return _backend["name"] == 'numpy'
+
+
+def to_array(numbers):
+    '''Convert list of numbers to int64 or float64 array
+
+    Returns:
+        (array, ints) tuple or None if the numbers cannot be stored in an
+        array exactly. Ints is None or a bool array telling which values of
+        a float64 array are ints.
+    '''
+    types = set(map(type, numbers))
+    if types <= {int}:
+        try:
+            return np.array(numbers, dtype=np.int64), None
+        except OverflowError:
+            return None
+    if types <= {float}:
+        return np.array(numbers, dtype=np.float64), None
+    if types <= {int, float} and all(
+            abs(i) <= FLOAT_INT_MAX for i in numbers if type(i) is int):
+        return np.array(numbers, dtype=np.float64), np.fromiter(
+            (type(i) is int for i in numbers), bool, len(numbers))
+    return None
+
+
+def _int_sum(array):
+    if max(-int(array.min()), int(array.max())) * array.size > INT64_MAX:
+        return sum(array.tolist())
+    return int(array.sum())
+
+
+def _sum(array):
+    if array.dtype.kind == 'i':
+        return _int_sum(array)
+    return float(array.sum())
+
+
+def _mean(array):
+    if array.dtype.kind == 'i':
+        total = _int_sum(array)
+        if not total % array.size:
+            # statistics.mean keeps exact means of ints as ints
+            return total // array.size
+        return total / array.size
+    return float(array.mean())
+
+
+def _median(array):
+    array = np.sort(array)
+    i = array.size // 2
+    if array.size % 2:
+        return array[i].item()
+    return (array[i - 1].item() + array[i].item()) / 2
+
+
+ARRAY_FUNCS = dict(
+    average=_mean,
+    max=lambda array: array.max().item(),
+    mean=_mean,
+    median=_median,
+    min=lambda array: array.min().item(),
+    sum=_sum,
+)
+
+
+def _mixed_item(array, ints, i):
+    value = array[i].item()
+    return int(value) if ints[i] else value
+
+
+def _mixed_median(array, ints):
+    order = np.argsort(array, kind='stable')
+    i = array.size // 2
+    if array.size % 2:
+        return _mixed_item(array, ints, order[i])
+    return (_mixed_item(array, ints, order[i - 1]) +
+            _mixed_item(array, ints, order[i])) / 2
+
+
+# Functions of float64 arrays with both ints and floats
+MIXED_FUNCS = dict(
+    max=lambda array, ints: _mixed_item(array, ints, array.argmax()),
+    median=_mixed_median,
+    min=lambda array, ints: _mixed_item(array, ints, array.argmin()),
+)
+
+
+def array_value(method, array, ints=None):
+    '''Compute value of method from non-empty array
+
+    Args:
+        method: Name of the value function
+        array: Array from to_array
+        ints: Int mask from to_array or None
+
+    Raises:
+        ValueError: Array is empty
+    '''
+    if not array.size:
+        raise ValueError('No numeric values')
+    if ints is not None and ints.all():
+        return ARRAY_FUNCS[method](array.astype(np.int64))
+    if ints is not None and ints.any() and method in MIXED_FUNCS:
+        return MIXED_FUNCS[method](array, ints)
+    return ARRAY_FUNCS[method](array)
+
+
+def array_windows(timestamps, aggregate_to, window_us):
+    '''Split timestamps to aggregation windows, see aggregate
+
+    Returns:
+        List of [window index, start, end] lists or None if the timestamps
+        are not in the format of timestamp_as_str
+    '''
+    if not all(isinstance(i, str) and len(i) in (20, 27) and (
+            i[-1] == 'Z') for i in timestamps):
+        return None
+    try:
+        stamps = np.array(
+            [i[:-1] for i in timestamps], dtype='datetime64[us]').astype(
+                np.int64)
+    except ValueError:
+        return None
+
+    offsets = stamps - stamps[0]
+    if window_us:
+        indices = np.maximum(-(-offsets // window_us) - 1, 0)
+    else:
+        indices = np.where(offsets <= 0, 0, aggregate_to)
+
+    outside = np.flatnonzero(indices >= aggregate_to)
+    end = int(outside[0]) if outside.size else len(timestamps)
+    indices = indices[:end]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(indices)) + 1))
+    ends = np.append(starts[1:], end)
+
+    windows = [
+        [int(indices[start]), int(start), int(end)]
+        for start, end in zip(starts, ends)]
+    if windows[-1][2] == len(timestamps):
+        windows[-1][0] = aggregate_to - 1
+    return windows
+
+
+def aggregate_arrays(data, keys, windows, aggregate_with):
+    '''Compute aggregated values of each window with arrays
+
+    Returns:
+        List of dicts of aggregated values by key for each window or None if
+        the values cannot be aggregated with arrays
+    '''
+    if aggregate_with not in ARRAY_FUNCS:
+        return None
+
+    end = windows[-1][2]
+    starts = np.array([start for _, start, _ in windows])
+    results = [{} for _ in windows]
+    for key in keys:
+        values = [d.get(key, _MISSING) for d in data[:end]]
+        is_number = [isinstance(i, Number) for i in values]
+        arrays = to_array([i for i, j in zip(values, is_number) if j])
+        if arrays is None:
+            return None
+        array, ints = arrays
+
+        positions = np.concatenate(([0], np.cumsum(is_number)))
+        missing = np.add.reduceat(
+            np.fromiter((i is _MISSING for i in values), bool, end), starts)
+        for result, (_, start, stop), is_missing in zip(
+                results, windows, missing):
+            window = slice(positions[start], positions[stop])
+            try:
+                result[key] = None if is_missing else array_value(
+                    aggregate_with,
+                    array[window],
+                    ints[window] if ints is not None else None)
+            except ValueError:
+                result[key] = None
+    return results
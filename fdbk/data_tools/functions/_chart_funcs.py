@@ -1,3 +1,5 @@
+from collections import Counter
+
 from .utils import chart_dict
 
 
@@ -7,11 +9,13 @@ def doughnut(data, field, parameteres=None, type_="doughnut"):
     if not field_data:
         return None
 
+    counts = Counter(field_data)
+    labels = list(set(field_data))
     return chart_dict(
         type=type_,
         field=field,
-        data=[field_data.count(label) for label in set(field_data)],
-        labels=list(set(field_data))
+        data=[counts[label] for label in labels],
+        labels=labels
     )
 
 
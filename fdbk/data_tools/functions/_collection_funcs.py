@@ -2,23 +2,40 @@ from fdbk.utils.messages import method_not_supported
 
 from .utils import statistics_dict
 from ._chart_funcs import CHART_FUNCS
-from ._status_funcs import STATUS_FUNCS
+from ._status_funcs import STATUS_COMPILERS, STATUS_FUNCS
 from ._value_funcs import VALUE_FUNCS
 
 
-def _collection(type_, data, field, parameters=None):
+def _compile_collection(type_, parameters=None):
     try:
         method = parameters.get("method", "latest")
         child_parameters = parameters.get("parameters")
     except AttributeError:
-        return None
+        return lambda data, field: None
 
     functions = {**CHART_FUNCS, **STATUS_FUNCS, **VALUE_FUNCS}
     if method not in functions:
-        raise ValueError(method_not_supported(method))
+        def unsupported(data, field):
+            raise ValueError(method_not_supported(method))
+        return unsupported
+
+    if method in STATUS_COMPILERS:
+        child = STATUS_COMPILERS[method](child_parameters)
+    else:
+        def child(data, field):
+            return functions.get(method)(data, field, child_parameters)
 
-    value_d = functions.get(method)(data, field, child_parameters)
-    return statistics_dict(type_, parameters=parameters, **value_d)
+    def run_collection(data, field):
+        value_d = child(data, field)
+        if value_d:
+            # Sketches of collection items are not combined
+            value_d.get("payload", {}).pop("sketch", None)
+        return statistics_dict(type_, parameters=parameters, **value_d)
+    return run_collection
+
+
+def _collection(type_, data, field, parameters=None):
+    return _compile_collection(type_, parameters)(data, field)
 
 
 def table_item(data, field, parameters=None):
@@ -33,3 +50,10 @@ COLLECTION_FUNCS = dict(
     list_item=list_item,
     table_item=table_item,
 )
+
+COLLECTION_COMPILERS = dict(
+    list_item=lambda parameters=None: _compile_collection(
+        "list_item", parameters),
+    table_item=lambda parameters=None: _compile_collection(
+        "table_item", parameters),
+)
@@ -0,0 +1,157 @@
+from math import ceil, isfinite, log
+
+# Values closer to zero than this are counted as zeros
+SKETCH_MIN_VALUE = 1e-9
+SKETCH_MAX_BINS = 2048
+
+
+class QuantileSketch:
+    '''Mergeable sketch of a distribution for estimating quantiles
+
+    Values are counted in bins whose widths grow exponentially, so that any
+    quantile can be estimated within the relative accuracy of the true
+    value. Sketches with the same accuracy can be merged, e.g., to combine
+    sketches of multiple time ranges or topics. Memory is bounded by
+    max_bins: when exceeded, the bins closest to zero are collapsed.
+    '''
+
+    def __init__(self, accuracy=0.01, max_bins=SKETCH_MAX_BINS):
+        accuracy = float(accuracy)
+        if not 0 < accuracy < 1:
+            raise ValueError('Sketch accuracy must be between 0 and 1')
+
+        self.accuracy = accuracy
+        self.max_bins = int(max_bins)
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def from_values(cls, values, accuracy=0.01):
+        sketch = cls(accuracy)
+        for value in values:
+            sketch.add(value)
+        return sketch
+
+    def _index(self, value):
+        return ceil(log(value) / self._log_gamma)
+
+    def _bin_value(self, index):
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value):
+        '''Add a number to the sketch, non-finite numbers are ignored
+        '''
+        value = float(value)
+        if not isfinite(value):
+            return
+
+        if value > SKETCH_MIN_VALUE:
+            bins, index = self.positive, self._index(value)
+            bins[index] = bins.get(index, 0) + 1
+        elif value < -SKETCH_MIN_VALUE:
+            bins, index = self.negative, self._index(-value)
+            bins[index] = bins.get(index, 0) + 1
+        else:
+            self.zeros += 1
+
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.positive) + len(self.negative) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        # Merges the bins closest to zero until the sketch fits max_bins
+        excess = len(self.positive) + len(self.negative) - self.max_bins
+        for bins in (self.positive, self.negative):
+            if excess <= 0 or len(bins) < 2:
+                continue
+            indices = sorted(bins)
+            n = min(excess, len(indices) - 1)
+            bins[indices[n]] += sum(bins.pop(i) for i in indices[:n])
+            excess -= n
+
+    def merge(self, other):
+        '''Add counts of other sketch to this sketch
+
+        Raises:
+            ValueError: Sketches have different accuracy
+        '''
+        if other.accuracy != self.accuracy:
+            raise ValueError('Cannot merge sketches of different accuracy')
+
+        for bins, other_bins in (
+                (self.positive, other.positive),
+                (self.negative, other.negative)):
+            for index, count in other_bins.items():
+                bins[index] = bins.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        for attr, function in (('min', min), ('max', max)):
+            values = [
+                i for i in (getattr(self, attr), getattr(other, attr))
+                if i is not None]
+            setattr(self, attr, function(values) if values else None)
+
+        if len(self.positive) + len(self.negative) > self.max_bins:
+            self._collapse()
+        return self
+
+    def quantile(self, q):
+        '''Estimate value at quantile q between 0 and 1
+
+        Returns:
+            Estimated value or None if the sketch is empty
+        '''
+        if not self.count:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+
+        rank = q * (self.count - 1)
+        seen = 0
+        bins = [
+            (-self._bin_value(i), self.negative[i])
+            for i in sorted(self.negative, reverse=True)]
+        bins.append((0.0, self.zeros))
+        bins.extend(
+            (self._bin_value(i), self.positive[i])
+            for i in sorted(self.positive))
+
+        for value, count in bins:
+            seen += count
+            if seen > rank:
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        return dict(
+            accuracy=self.accuracy,
+            max_bins=self.max_bins,
+            positive=dict(self.positive),
+            negative=dict(self.negative),
+            zeros=self.zeros,
+            count=self.count,
+            min=self.min,
+            max=self.max)
+
+    @classmethod
+    def from_dict(cls, sketch_d):
+        sketch = cls(sketch_d["accuracy"], sketch_d["max_bins"])
+        sketch.positive = {
+            int(i): count for i, count in sketch_d["positive"].items()}
+        sketch.negative = {
+            int(i): count for i, count in sketch_d["negative"].items()}
+        sketch.zeros = sketch_d["zeros"]
+        sketch.count = sketch_d["count"]
+        sketch.min = sketch_d["min"]
+        sketch.max = sketch_d["max"]
+        return sketch
@@ -1,3 +1,5 @@
+from copy import deepcopy
+
 from fdbk.utils.messages import method_not_supported
 
 from ._value_funcs import VALUE_FUNCS as functions
@@ -20,12 +22,16 @@ OPERATORS = {
 }
 
 
-def _get_value(method, data, field, parameters=None):
-    if method not in functions:
-        raise ValueError(method_not_supported(method))
+def _resolve_value_function(method):
+    function = functions.get(method)
+    if not function:
+        def unsupported(data, field):
+            raise ValueError(method_not_supported(method))
+        return unsupported
 
-    value_d = functions.get(method)(data, field, parameters)
-    return value_d.get("payload", {}).get("value")
+    def value(data, field):
+        return function(data, field).get("payload", {}).get("value")
+    return value
 
 
 def _get_status_parameters(parameters=None):
@@ -55,84 +61,126 @@ def _run_assertion(assertion, value, other):
         return False
 
 
-def _run_check(value, check):
-    status = check.get("status", 'WARNING')
-    operator = str(check.get("operator", 'or')).lower()
-
-    result = False if operator == 'or' else True
+def _compile_check(check):
+    # Returns function that returns status of the check for a value
+    try:
+        status = check.get("status", 'WARNING')
+        operator = str(check.get("operator", 'or')).lower()
+        assertions = [
+            (assertion, check.get(assertion)) for assertion in ASSERTIONS
+            if check.get(assertion)]
+    except Exception as error:
+        def invalid(value):
+            raise error
+        return invalid
 
     if operator not in OPERATORS:
-        raise RuntimeError(f"Operator {operator} was not recognized")
+        def unsupported(value):
+            raise RuntimeError(f"Operator {operator} was not recognized")
+        return unsupported
 
-    for assertion in ASSERTIONS:
-        other = check.get(assertion)
-        if not other:
-            continue
+    combine = OPERATORS.get(operator)
 
-        new_result = _run_assertion(assertion, value, other)
-        result = OPERATORS.get(operator)(result, new_result)
+    def run_check(value):
+        result = False if operator == 'or' else True
+        for assertion, other in assertions:
+            result = combine(result, _run_assertion(assertion, value, other))
 
-    if result:
-        return status
-    return None
+        if result:
+            return status
+        return None
+    return run_check
 
 
-def status(data, field, parameters=None):
-    if not len(data):
-        return None
+def compile_status(parameters=None):
+    '''Compile status data tool with given parameters
 
-    warnings = []
+    Returns:
+        Function that takes data and field and returns the status
+    '''
     try:
         default, checks, short_circuit, method = _get_status_parameters(
             parameters)
     except BaseException:
-        return None
+        return lambda data, field: None
 
-    value = _get_value(method, data, field, parameters)
+    checks = [(check, _compile_check(check)) for check in checks]
 
-    status_d = dict(field=field, status=default, reason=None)
+    get_value = _resolve_value_function(method)
 
-    for check in checks:
-        try:
-            new_status = _run_check(value, check)
-        except RuntimeError as error:
-            new_status = None
-            warnings.append(str(error))
+    def run_status(data, field):
+        if not len(data):
+            return None
 
-        if new_status:
-            status_d["status"] = new_status
-            status_d["reason"] = check
+        warnings = []
+        value = get_value(data, field)
 
-            if short_circuit:
-                break
+        status_d = dict(field=field, status=default, reason=None)
 
-    if warnings:
-        status_d["metadata"] = {}
-        status_d["metadata"]["warnings"] = warnings
+        for check, run_check in checks:
+            try:
+                new_status = run_check(value)
+            except RuntimeError as error:
+                new_status = None
+                warnings.append(str(error))
 
-    return status_dict(**status_d)
+            if new_status:
+                status_d["status"] = new_status
+                status_d["reason"] = deepcopy(check)
 
+                if short_circuit:
+                    break
 
-def warning(data, field, parameters=None):
-    if not len(data):
-        return None
+        if warnings:
+            status_d["metadata"] = {}
+            status_d["metadata"]["warnings"] = warnings
+
+        return status_dict(**status_d)
+    return run_status
+
+
+def compile_warning(parameters=None):
+    '''Compile warning data tool with given parameters
 
+    Returns:
+        Function that takes data and field and raises AssertionError with
+        the warning message if the check fails
+    '''
     try:
         check, message, method = _get_warning_parameters(parameters)
     except BaseException:
-        return None
+        return lambda data, field: None
 
     if not check or not message:
-        return None
+        return lambda data, field: None
+
+    get_value = _resolve_value_function(method)
+    run_check = _compile_check(check)
 
-    value = _get_value(method, data, field, parameters)
-    warning = _run_check(value, check)
+    def run_warning(data, field):
+        if not len(data):
+            return None
 
-    if warning:
-        raise AssertionError(message)
+        value = get_value(data, field)
+        if run_check(value):
+            raise AssertionError(message)
+    return run_warning
+
+
+def status(data, field, parameters=None):
+    return compile_status(parameters)(data, field)
+
+
+def warning(data, field, parameters=None):
+    return compile_warning(parameters)(data, field)
 
 
 STATUS_FUNCS = dict(
     status=status,
     warning=warning,
 )
+
+STATUS_COMPILERS = dict(
+    status=compile_status,
+    warning=compile_warning,
+)
@@ -1,25 +1,106 @@
 from numbers import Number
 from statistics import mean, median
 
-from .utils import value_dict
+from fdbk.utils.messages import invalid_parameters
 
+from ._backend import ARRAY_FUNCS, array_value
+from ._sketch import QuantileSketch
+from .utils import CachedData, value_dict
 
-def use_function(function, name, check_empty=False):
+
+def _numbers(data, field, check_empty):
+    if check_empty:
+        next(d[field] for d in data if isinstance(d[field], Number))
+    return (d[field] for d in data if isinstance(d[field], Number))
+
+
+def _cached_value(function, name, data, field, check_empty, sort):
+    arrays = data.array(field) if name in ARRAY_FUNCS else None
+    if arrays is not None:
+        return array_value(name, *arrays)
+
+    numbers = data.sorted_numbers(field) if sort else data.numbers(field)
+    if check_empty and not numbers:
+        raise StopIteration
+    return function(numbers)
+
+
+def use_function(function, name, check_empty=False, sort=False):
     def value_function(data, field, parameters=None):
         try:
-            if check_empty:
-                next(d[field] for d in data if isinstance(d[field], Number))
+            if isinstance(data, CachedData):
+                value = data.result((function, field), lambda: _cached_value(
+                    function, name, data, field, check_empty, sort))
+            else:
+                value = function(_numbers(data, field, check_empty))
 
-            return value_dict(
-                type=name, field=field, value=function(
-                    d[field] for d in data if isinstance(
-                        d[field], Number)))
+            return value_dict(type=name, field=field, value=value)
         except Exception:
             return None
 
     return value_function
 
 
+def _get_sketch(data, field, accuracy):
+    return data.result(
+        (QuantileSketch, field, accuracy),
+        lambda: QuantileSketch.from_values(data.numbers(field), accuracy))
+
+
+def _percentile_value(data, field, parameters, default, name):
+    parameters = parameters or {}
+    try:
+        percentile_ = float(parameters.get("percentile", default))
+        accuracy = float(parameters.get("accuracy", 0.01))
+        # Checks the accuracy even if the sketch is not needed
+        QuantileSketch(accuracy)
+    except (TypeError, ValueError) as error:
+        raise ValueError(invalid_parameters(name, error))
+
+    if isinstance(data, CachedData):
+        numbers = data.sorted_numbers(field)
+    else:
+        numbers = sorted(_numbers(data, field, False))
+    if not numbers:
+        return None
+
+    q = min(max(percentile_ / 100, 0), 1)
+    result = value_dict(
+        type=name,
+        field=field,
+        value=numbers[int(q * (len(numbers) - 1))],
+        percentile=percentile_,
+    )
+    if isinstance(data, CachedData) and data.sketches:
+        result["payload"]["sketch"] = _get_sketch(
+            data, field, accuracy).to_dict()
+    return result
+
+
+def percentile(data, field, parameters=None):
+    '''Get percentile of the field
+
+    Value at the percentile is taken from the sorted values of the field.
+    When run with sketches, the quantile sketch of the values is included
+    in the payload, so that the percentiles of multiple topics can be
+    combined.
+
+    Parameters:
+        percentile: Percentile between 0 and 100. Defaults to 50.
+        accuracy: Relative accuracy of the sketch. Defaults to 0.01.
+    '''
+    return _percentile_value(data, field, parameters, 50, "percentile")
+
+
+def use_percentile(percentile_, name):
+    def percentile_function(data, field, parameters=None):
+        return _percentile_value(
+            data, field, dict(parameters or {}, percentile=percentile_),
+            percentile_, name)
+
+    return percentile_function
+
+
 def latest(data, field, parameters=None):
     if not data:
         return None
@@ -55,12 +136,26 @@ def last_falsy(data, field, parameters=None):
     return last(False, data, field)
 
 
+# Functions of numeric values of a field used by the value data tools
+NUMBER_FUNCS = dict(
+    average=mean,
+    max=max,
+    mean=mean,
+    median=median,
+    min=min,
+    sum=sum,
+)
+
 VALUE_FUNCS = dict(
     average=use_function(mean, 'average'),
     max=use_function(max, 'max'),
     mean=use_function(mean, 'mean'),
-    median=use_function(median, 'median'),
+    median=use_function(median, 'median', sort=True),
     min=use_function(min, 'min'),
+    p90=use_percentile(90, 'p90'),
+    p95=use_percentile(95, 'p95'),
+    p99=use_percentile(99, 'p99'),
+    percentile=percentile,
     latest=latest,
     last_truthy=last_truthy,
     last_falsy=last_falsy,
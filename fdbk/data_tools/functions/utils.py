@@ -1,3 +1,8 @@
+from numbers import Number
+
+from ._backend import to_array, use_numpy
+
+
 def statistics_dict(type_, metadata=None, parameters=None, **kwargs):
     statistic_d = dict(type=type_, payload=kwargs)
     if metadata:
@@ -18,3 +23,59 @@ def value_dict(**kwargs):
 
 def status_dict(**kwargs):
     return statistics_dict("status", **kwargs)
+
+
+class CachedData(list):
+    '''Data shared by the data tools of a single run
+
+    Numeric values of each field are extracted from the data only once and
+    results of value functions are reused by the other data tools, e.g.,
+    by status checks of the same field and method. With sketches, quantile
+    sketches are included in percentile results.
+    '''
+
+    def __init__(self, data, sketches=False):
+        super().__init__(data)
+        self.sketches = sketches
+        self._numbers = {}
+        self._sorted = {}
+        self._arrays = {}
+        self._results = {}
+
+    def numbers(self, field):
+        '''Get numeric values of the field in data order
+
+        Raises:
+            KeyError: Field is missing from a data point
+        '''
+        if field not in self._numbers:
+            self._numbers[field] = [
+                d[field] for d in self if isinstance(d[field], Number)]
+        return self._numbers[field]
+
+    def sorted_numbers(self, field):
+        '''Get numeric values of the field in ascending order
+        '''
+        if field not in self._sorted:
+            self._sorted[field] = sorted(self.numbers(field))
+        return self._sorted[field]
+
+    def array(self, field):
+        '''Get numeric values of the field as an array
+
+        Returns:
+            (array, ints) tuple from to_array or None if NumPy backend is not
+            used or the values cannot be stored in an array exactly
+        '''
+        if not use_numpy():
+            return None
+        if field not in self._arrays:
+            self._arrays[field] = to_array(self.numbers(field))
+        return self._arrays[field]
+
+    def result(self, key, compute):
+        '''Get result of compute for the key, computing it on first use
+        '''
+        if key not in self._results:
+            self._results[key] = compute()
+        return self._results[key]
@@ -3,7 +3,7 @@
 
 import logging
 
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, stream_with_context
 
 from fdbk.utils import create_db_connection
 from fdbk.utils.messages import *
@@ -64,10 +64,37 @@ def generate_app(
             return _jsonify(handlers.add_data(
                 topic_id, json_in, query_args=request.args))
 
+    @app.route('/topics/<topic_id>/data/iter', methods=['GET'])
+    def data_iter(topic_id):
+        return _jsonify(handlers.iter_data(topic_id, request.args))
+
+    @app.route('/data', methods=['POST'])
+    def data_many():
+        try:
+            json_in = request.get_json()
+        except BaseException:
+            return jsonify({
+                "error": "No data provided in request"
+            }), 404
+        return _jsonify(handlers.add_data_many(
+            json_in, query_args=request.args))
+
+    @app.route('/data/<topic_ids>', methods=['GET'])
+    def data_get_many(topic_ids):
+        return _jsonify(handlers.get_data_many(topic_ids, request.args))
+
     @app.route('/topics/<topic_id>/data/latest', methods=['GET', 'POST'])
     def latest(topic_id):
         return _jsonify(handlers.get_latest(topic_id))
 
+    @app.route('/latest/<topic_ids>', methods=['GET'])
+    def latest_many(topic_ids):
+        return _jsonify(handlers.get_latest_many(topic_ids))
+
+    @app.route('/latest', methods=['GET'])
+    def latest_all():
+        return _jsonify(handlers.get_latest_many())
+
     @app.route('/topics/<topic_id>/summary', methods=['GET'])
     def summary(topic_id):
         return _jsonify(handlers.get_summary(
@@ -81,6 +108,15 @@ def generate_app(
     def comparison_all():
         return _jsonify(handlers.get_comparison(query_args=request.args))
 
+    @app.route('/overview/stream', methods=['GET'])
+    def overview_stream():
+        response, code = handlers.iter_overview(request.args)
+        if code != 200:
+            return jsonify(response), code
+        return Response(
+            stream_with_context(response),
+            mimetype='application/x-ndjson')
+
     @app.route('/overview/<type>', methods=['GET'])
     def overview(type_):
         return _jsonify(handlers.get_overview(type_, request.args))
@@ -1,6 +1,9 @@
 '''Development server handlers, interfaces not stable
 '''
 
+from itertools import islice
+import json
+
 from dateutil.parser import isoparse
 
 
@@ -69,6 +72,19 @@ def _get_topics_parameters(query_args):
     return query_args.get('type'), query_args.get('template')
 
 
+def _parse_data_point(data_d):
+    # Returns data dict with timestamp as datetime or None if invalid
+    if not isinstance(data_d, dict):
+        return None
+    if "timestamp" not in data_d:
+        return data_d
+
+    timestamp = _parse_param(data_d["timestamp"], isoparse)
+    if not timestamp:
+        return None
+    return {**data_d, "timestamp": timestamp}
+
+
 class ServerHandlers:
     def __init__(self, db_connection):
         self._db_connection = db_connection
@@ -119,6 +135,33 @@ class ServerHandlers:
             "success": "Data successfully added to DB"
         }, 200
 
+    def add_data_many(self, json_in, query_args=None):
+        overwrite = _get_overwrite(query_args)
+        if not isinstance(json_in, list):
+            return {
+                "error": "No list of data points in input data"
+            }, 400
+
+        results = [None] * len(json_in)
+        data = []
+        indices = []
+        for i, data_d in enumerate(json_in):
+            data_d = _parse_data_point(data_d)
+            if data_d is None:
+                results[i] = dict(error="Invalid data point in input data")
+                continue
+            data.append(data_d)
+            indices.append(i)
+
+        added = self._db_connection.add_data_many(data, overwrite=overwrite)
+        for i, result in zip(indices, added):
+            results[i] = result
+
+        return {
+            "results": results,
+            "success": "Data points processed"
+        }, 200
+
     def get_topics(self, query_args=None):
         params = _get_topics_parameters(query_args)
         return self._db_connection.get_topics(*params), 200
@@ -133,10 +176,38 @@ class ServerHandlers:
             (topic_id,),
             parse_filter_parameters(query_args))
 
+    def get_data_many(self, topic_ids, query_args):
+        return _get_response_or_not_found(
+            self._db_connection.get_data_many,
+            (topic_ids.split(','),),
+            parse_filter_parameters(query_args))
+
+    def iter_data(self, topic_id, query_args):
+        params = parse_filter_parameters(query_args)
+        batch_size = _parse_param(query_args.get('batch_size'), int) or 1000
+
+        def read_batch():
+            data = list(islice(self._db_connection.iter_data(
+                topic_id,
+                params["since"],
+                params["until"],
+                batch_size=batch_size,
+                cursor=query_args.get('cursor')), batch_size))
+            return dict(
+                data=data,
+                cursor=data[-1]["timestamp"] if (
+                    len(data) == batch_size) else None)
+
+        return _get_response_or_not_found(read_batch, ())
+
     def get_latest(self, topic_id):
         return _get_response_or_not_found(
             self._db_connection.get_latest, (topic_id,))
 
+    def get_latest_many(self, topic_ids=None):
+        topic_ids_a = topic_ids.split(',') if topic_ids else None
+        return self._db_connection.get_latest_many(topic_ids_a), 200
+
     def get_summary(self, topic_id, query_args):
         return _get_response_or_not_found(
             self._db_connection.get_summary,
@@ -159,6 +230,32 @@ class ServerHandlers:
                 "error": str(error)
             }, 404
 
+    def iter_overview(self, query_args=None):
+        '''Get overview as JSON lines as topics are finished
+        '''
+        if not query_args:
+            query_args = {}
+
+        topic_ids = query_args.get('topic_ids')
+        params = parse_filter_parameters(query_args, include_aggregate=True)
+        try:
+            overview = self._db_connection.iter_overview(
+                topic_ids.split(',') if topic_ids else None,
+                template=query_args.get('template'),
+                **params)
+            first = next(overview)
+        except KeyError as error:
+            return {
+                "error": str(error)
+            }, 404
+
+        def lines():
+            yield json.dumps(first) + '\n'
+            for item in overview:
+                yield json.dumps(item) + '\n'
+
+        return lines(), 200
+
     def get_overview(self, template=None, query_args=None):
         if not query_args:
             query_args = {}
@@ -121,6 +121,37 @@ class CommonTest:
         self.assertEqual(len(data), 1)
         self.assertEqual(data[0]["number"], 7)
 
+    def test_add_data_many_reports_errors_per_data_point(self):
+        topic_id = self.C.add_topic("topic", fields=["number"])
+        template_id = self.C.add_topic(
+            "template", type_str="template", fields=["number"])
+        timestamp = datetime(2020, 1, 1, 1, 0)
+
+        results = self.C.add_data_many([
+            dict(topic_id=topic_id, number=1, timestamp=timestamp),
+            dict(topic_id=topic_id, number=2, timestamp=timestamp),
+            dict(topic_id=topic_id, letter="a"),
+            dict(topic_id="topic_id", number=3),
+            dict(topic_id=template_id, number=4),
+            dict(
+                topic_id=topic_id,
+                number=5,
+                timestamp=datetime(2020, 1, 1, 1, 1)),
+        ])
+
+        self.assertEqual(
+            [i.get("timestamp") for i in results],
+            ['2020-01-01T01:00:00Z', None, None, None, None,
+             '2020-01-01T01:01:00Z'])
+        self.assertTrue(all(i.get("error") for i in results[1:5]))
+        self.assertEqual(
+            [i["number"] for i in self.C.get_data(topic_id)], [1, 5])
+
+        self.C.add_data_many([
+            dict(topic_id=topic_id, number=6, timestamp=timestamp),
+        ], overwrite=True)
+        self.assertEqual(self.C.get_data(topic_id)[0]["number"], 6)
+
     def test_cannot_get_undefined_topic(self):
         with self.assertRaises(KeyError):
             self.C.get_topic("topic_id")
@@ -164,6 +195,32 @@ class CommonTest:
         self.assertEqual(data[0].get('timestamp'), '2020-01-01T01:05:00Z')
         self.assertEqual(len(data), 5)
 
+    def test_get_data_many_matches_get_data(self):
+        topic_id = self._create_data_for_filter_test()
+        other_id = self.C.add_topic("other", fields=["number"])
+        since = datetime(2020, 1, 1, 1, 2)
+
+        data = self.C.get_data_many([topic_id, other_id], since=since, limit=3)
+        self.assertEqual(data, {
+            topic_id: self.C.get_data(topic_id, since=since, limit=3),
+            other_id: [],
+        })
+
+        with self.assertRaises(KeyError):
+            self.C.get_data_many([topic_id, "Not found"])
+
+    def test_iter_data_continues_after_cursor(self):
+        topic_id = self._create_data_for_filter_test()
+        since = datetime(2020, 1, 1, 1, 2)
+
+        data = list(self.C.iter_data(topic_id, since=since, batch_size=3))
+        self.assertEqual(data, self.C.get_data(topic_id, since=since))
+
+        data = list(self.C.iter_data(
+            topic_id, batch_size=3, cursor=data[3]["timestamp"]))
+        self.assertEqual(data[0].get('timestamp'), '2020-01-01T01:06:00Z')
+        self.assertEqual(len(data), 4)
+
     def test_can_get_summary_since_until_limit(self):
         topic_id = self._create_data_for_filter_test()
 
@@ -27,6 +27,21 @@ def method_not_supported(method):
     return f'The requested method "{method}" is not supported.'
 
 
+def invalid_parameters(method, error):
+    return f'Invalid parameters for method "{method}": {error}'
+
+
+def sketches_not_combined(field, method):
+    return (
+        f'Percentiles "{method}" of field "{field}" have sketches of '
+        f'different accuracy and were not combined.'
+    )
+
+
+def executor_not_supported(executor):
+    return f'The requested executor "{executor}" is not supported.'
+
+
 def no_data(topic_d=None):
     if topic_d:
         topic_details = f' for topic {_topic_str(topic_d)}'
@@ -39,6 +54,10 @@ def topic_not_found(id_):
     return f'Topic ID "{id_}" not found from database.'
 
 
+def topic_timed_out(topic_d):
+    return f'Data tools of topic {_topic_str(topic_d)} did not finish in time.'
+
+
 def duplicate_timestamp(topic_d, timestamp):
     return (
         f'Topic {_topic_str(topic_d)} already has data for given timestamp '
@@ -46,6 +65,13 @@ def duplicate_timestamp(topic_d, timestamp):
     )
 
 
+def expired_timestamp(topic_d, timestamp):
+    return (
+        f'Topic {_topic_str(topic_d)} does not retain data for given '
+        f'timestamp ({timestamp}).'
+    )
+
+
 def duplicate_topic_id(id_):
     return (
         f'Topic ID "{id_}" already found from the database.'
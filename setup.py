@@ -33,6 +33,9 @@ setuptools.setup(
         "python-dateutil",
         "requests"
     ],
+    extras_require={
+        "numpy": ["numpy"]
+    },
     python_requires='>=3.6',
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -94,3 +94,91 @@ class ClientConnectionTest(TestCase):
 
             statistics = C.get_overview()["statistics"]
             self.assertEqual(len(statistics), 1)
+
+    def test_add_data_many(self):
+        with patch('requests.get', side_effect=self.mock_requests_get), \
+            patch('requests.post', side_effect=self.mock_requests_post) as post_mock:
+            C = ClientConnection("", batch_size=2)
+            topic_id = C.add_topic("topic", fields=["number"])
+            post_mock.reset_mock()
+
+            results = C.add_data_many([
+                dict(topic_id=topic_id, number=i, timestamp=datetime(2020, 1, 1, 1, i))
+                for i in range(3)
+            ] + [dict(topic_id=topic_id, number=3, timestamp="invalid")])
+
+            self.assertEqual(post_mock.call_count, 2)
+            self.assertEqual(results[0]["timestamp"], "2020-01-01T01:00:00Z")
+            self.assertIn("error", results[3])
+            self.assertEqual(len(C.get_data(topic_id)), 3)
+
+    def test_iter_data(self):
+        with patch('requests.get', side_effect=self.mock_requests_get) as get_mock, \
+            patch('requests.post', side_effect=self.mock_requests_post):
+            C = ClientConnection("")
+            topic_id = C.add_topic("topic", fields=["number"])
+            C.add_data_many([
+                dict(topic_id=topic_id, number=i, timestamp=datetime(2020, 1, 1, 1, i))
+                for i in range(5)])
+
+            get_mock.reset_mock()
+            data = list(C.iter_data(topic_id, batch_size=2))
+            self.assertEqual(get_mock.call_count, 3)
+            self.assertEqual([i["number"] for i in data], list(range(5)))
+
+            data = list(C.iter_data(topic_id, batch_size=2, cursor=data[2]["timestamp"]))
+            self.assertEqual([i["number"] for i in data], [3, 4])
+
+            with self.assertRaises(RuntimeError):
+                list(C.iter_data("Not found"))
+
+    def test_get_latest_and_get_latest_many(self):
+        with patch('requests.get', side_effect=self.mock_requests_get), \
+            patch('requests.post', side_effect=self.mock_requests_post):
+            C = ClientConnection("")
+            C.add_topic("template", type_str="template", fields=["number"])
+            topic_id = C.add_topic("topic", fields=["number"])
+            empty_id = C.add_topic("empty", fields=["number"])
+
+            with self.assertRaises(RuntimeError):
+                C.get_latest(topic_id)
+
+            C.add_data(topic_id, dict(number=1))
+            C.add_data(topic_id, dict(number=2))
+            self.assertEqual(C.get_latest(topic_id)["number"], 2)
+
+            latest = C.get_latest_many()
+            self.assertEqual(set(latest), {topic_id, empty_id})
+            self.assertEqual(latest[topic_id]["number"], 2)
+            self.assertIsNone(latest[empty_id])
+
+            latest = C.get_latest_many([topic_id, "Not found"])
+            self.assertEqual(latest[topic_id]["number"], 2)
+            self.assertIsNone(latest["Not found"])
+
+    def test_get_data_many_reads_all_topics_in_one_request(self):
+        with patch('requests.get', side_effect=self.mock_requests_get) as get_mock, \
+            patch('requests.post', side_effect=self.mock_requests_post):
+            C = ClientConnection("")
+            data_tools = [{"field":"number", "method":"median"}]
+            topic_ids = [
+                C.add_topic(name, fields=["number"], data_tools=data_tools)
+                for name in ("a", "b", "c")]
+            for i, topic_id in enumerate(topic_ids):
+                C.add_data(topic_id, dict(number=i))
+
+            data = C.get_data_many(topic_ids[:2])
+            self.assertEqual(data, {i: C.get_data(i) for i in topic_ids[:2]})
+            self.assertEqual(C.get_data_many([]), {})
+            with self.assertRaises(RuntimeError):
+                C.get_data_many(["Not found"])
+
+            for executor, requests in (("thread", 3), ("process", 1)):
+                C.configure_executor(executor, 1)
+                get_mock.reset_mock()
+                statistics = C.get_overview()["statistics"]
+                self.assertEqual(len(statistics), 3)
+                data_calls = [
+                    i for i in get_mock.call_args_list if "data" in i[0][0]]
+                self.assertEqual(len(data_calls), requests)
+            C.close()
@@ -1,9 +1,13 @@
+from copy import deepcopy
 from os import path
-from unittest import TestCase
+from random import Random
+from unittest import skipUnless, TestCase
 from unittest.mock import Mock, patch
 import yaml
 
-from fdbk.data_tools import aggregate, functions, run_data_tools, post_process
+from fdbk.data_tools import (
+    aggregate, combine_run_outputs, functions, get_backend, get_plan,
+    QuantileSketch, run_data_tools, post_process, set_backend)
 from fdbk.utils.messages import method_not_supported, no_data
 from fdbk.validate import validate_statistics_array
 
@@ -26,6 +30,19 @@ AGGREGATE_ALWAYS_DATA = generate_test_data(4, [
     '2020-09-12T00:00:02Z',
     '2020-09-13T00:00:00Z',])
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def generate_random_data(random, N, values):
+    return [
+        dict(
+            number=random.choice(values),
+            number2=random.randint(-10**6, 10**6),
+            timestamp=_test_timestamp(i + random.randint(0, 1) * 60))
+        for i in range(N)]
+
 class DataToolsTest(TestCase):
     def test_summary_funcs_return_none_on_empty_data(self):
         for fn in functions.values():
@@ -197,6 +214,31 @@ class DataToolsTest(TestCase):
             self.assertEqual(aggregated[i].get('number'), i)
             self.assertEqual(aggregated[i].get('number2'), i * 2)
 
+    def test_aggregate_mixed_timestamp_formats(self):
+        data = generate_test_data(4, [
+            '2020-09-12T00:00:00Z',
+            '2020-09-12T00:00:00.500000Z',
+            '2020-09-12T03:00:01+02:00',
+            '2020-09-12T02:00:00Z',])
+        aggregated, warnings = aggregate(data, 2)
+
+        self.assertEqual(
+            [(i['timestamp'], i['number'], i['letter']) for i in aggregated],
+            [('2020-09-12T00:00:00Z', 0.5, None),
+             ('2020-09-12T01:00:00Z', 2.5, None)])
+        self.assertEqual(warnings, [])
+
+    def test_aggregate_equal_timestamps_to_last_window(self):
+        data = generate_test_data(3, ['2020-09-12T00:00:00Z'] * 3)
+        aggregated, warnings = aggregate(
+            data, 5, 'sum', aggregate_always=True)
+
+        self.assertEqual(aggregated, [dict(
+            timestamp='2020-09-12T00:00:00Z',
+            number=3,
+            number2=6,
+            letter=None)])
+
     def test_aggregate_unknown_data_tool(self):
         data = generate_test_data(15)
         aggregated, warnings = aggregate(data, 10, 'horse')
@@ -218,6 +260,158 @@ class DataToolsTest(TestCase):
         self.assertEqual(aggregated[1]["number"], 3)
         self.assertEqual(warnings, [])
 
+    def test_data_tools_of_same_field_read_data_once(self):
+        class CountingDict(dict):
+            reads = 0
+
+            def __getitem__(self, key):
+                if key == 'number':
+                    CountingDict.reads += 1
+                return super().__getitem__(key)
+
+        data = [CountingDict(i) for i in generate_test_data(11)]
+        methods = ['min', 'average', 'median', 'max', 'mean']
+        topic_d = dict(STATUS_TOPIC, data_tools=[
+            dict(field='number', method=method) for method in methods] + [
+            dict(field='number', method='status', parameters=dict(
+                method='median',
+                default='OK',
+                checks=[dict(status='WARNING', gte=5)]))])
+
+        results, warnings = run_data_tools(topic_d, data)
+        self.assertEqual(CountingDict.reads, 2 * len(data))
+        self.assertEqual(
+            [i['payload'].get('value') for i in results[:-1]],
+            [0, 5, 5, 10, 5])
+        self.assertEqual(results[-1]['payload']['status'], 'WARNING')
+        self.assertEqual(warnings, [])
+
+    def test_data_tool_plans_are_compiled_once_per_topic(self):
+        data = generate_test_data()
+        topic_d = dict(STATUS_TOPIC, name='Plan test', data_tools=[
+            dict(field='number', method='average'),
+            dict(field='number', method='status', parameters=dict(
+                default='OK', checks=[dict(status='WARNING', gte=5)])),
+            dict(field='undefined', method='average'),
+        ])
+
+        plan = get_plan(topic_d)
+        self.assertIs(get_plan(deepcopy(topic_d)), plan)
+        self.assertEqual(plan.steps[0].unit, 'scalar')
+        self.assertIsNotNone(plan.steps[2].error)
+
+        with patch('fdbk.data_tools._plan.compile_plan') as compile_mock:
+            results, warnings = run_data_tools(deepcopy(topic_d), data)
+        compile_mock.assert_not_called()
+        self.assertEqual(results[0]['payload']['unit'], 'scalar')
+        self.assertEqual(results[1]['payload']['status'], 'WARNING')
+        self.assertEqual(len(warnings), 1)
+
+        original = deepcopy(topic_d)
+        topic_d['data_tools'][1]['parameters']['checks'][0]['gte'] = 10
+        self.assertIsNot(get_plan(topic_d), plan)
+        results, _ = run_data_tools(topic_d, data)
+        self.assertEqual(results[1]['payload']['status'], 'OK')
+
+        reason = dict(status='WARNING', gte=5)
+        results, _ = run_data_tools(original, data)
+        self.assertEqual(results[1]['payload']['reason'], reason)
+        results[1]['payload']['reason']['gte'] = 0
+        results, _ = run_data_tools(original, data)
+        self.assertEqual(results[1]['payload']['reason'], reason)
+
+    def test_percentile_functions(self):
+        random = Random(2)
+        data = [
+            dict(number=random.lognormvariate(0, 2) * random.choice((-1, 1)))
+            for _ in range(2000)] + [dict(number=0), dict(number=None)]
+        numbers = sorted(i['number'] for i in data if i['number'] is not None)
+
+        tests = [
+            ('p90', None, 90),
+            ('p95', None, 95),
+            ('p99', dict(accuracy=0.001), 99),
+            ('percentile', None, 50),
+            ('percentile', dict(percentile=0), 0),
+            ('percentile', dict(percentile=100, accuracy='0.05'), 100),
+        ]
+
+        for method, parameters, q in tests:
+            result = functions.get(method)(data, 'number', parameters)
+            exact = numbers[int(q / 100 * (len(numbers) - 1))]
+
+            self.assertEqual(result['payload']['type'], method)
+            self.assertEqual(result['payload']['percentile'], q)
+            self.assertEqual(result['payload']['value'], exact)
+            self.assertNotIn('sketch', result['payload'])
+
+        topic_d = dict(STATUS_TOPIC, data_tools=[
+            dict(field='number', method='percentile', parameters=dict(
+                percentile=[50])),
+            dict(field='number', method='p90', parameters=dict(accuracy=2)),
+        ])
+        results, warnings = run_data_tools(topic_d, data)
+        self.assertEqual(results, [])
+        self.assertEqual(len(warnings), 2)
+        self.assertIn('percentile', warnings[0])
+        self.assertIn('p90', warnings[1])
+
+    def test_quantile_sketch_merge(self):
+        random = Random(3)
+        values = [random.gauss(0, 100) for _ in range(3000)]
+
+        merged = QuantileSketch.from_values(values[:1000])
+        merged.merge(QuantileSketch.from_dict(
+            QuantileSketch.from_values(values[1000:]).to_dict()))
+        sketch = QuantileSketch.from_values(values)
+
+        self.assertEqual(merged.to_dict(), sketch.to_dict())
+        with self.assertRaises(ValueError):
+            merged.merge(QuantileSketch(0.05))
+
+        small = QuantileSketch(max_bins=10)
+        for value in values:
+            small.add(value)
+        self.assertLessEqual(len(small.positive) + len(small.negative), 10)
+        self.assertEqual(small.quantile(1), max(values))
+
+    def test_percentiles_of_topics_are_combined(self):
+        data = generate_test_data(100)
+        outputs = []
+        for name, part in (('A', data[:30]), ('B', data[30:])):
+            topic_d = dict(STATUS_TOPIC, name=name, data_tools=[
+                dict(field='number', method='p90'),
+                dict(field='number', method='table_item', parameters=dict(
+                    name='P90', method='p90')),
+            ])
+            outputs.append(run_data_tools(topic_d, part, sketches=True))
+
+        results, warnings = combine_run_outputs(outputs)
+        self.assertEqual(len(warnings), 0)
+        validate_statistics_array(results)
+        self.assertNotIn('sketch', str(results))
+
+        values = [i['payload'] for i in results if i['type'] == 'value']
+        self.assertEqual(
+            [i['topic_name'] for i in values], ['A', 'B', 'A, B'])
+        for value, exact in zip(values, (26, 92, 89)):
+            self.assertAlmostEqual(value['value'], exact, delta=0.01 * exact)
+        self.assertEqual(values[-1]['topic_names'], ['A', 'B'])
+        self.assertEqual(values[-1]['unit'], 'scalar')
+
+        outputs = []
+        for name, part, accuracy in (
+                ('A', data[:30], 0.01), ('B', data[30:], 0.05)):
+            topic_d = dict(STATUS_TOPIC, name=name, data_tools=[
+                dict(field='number', method='p90', parameters=dict(
+                    accuracy=accuracy))])
+            outputs.append(run_data_tools(topic_d, part, sketches=True))
+
+        results, warnings = combine_run_outputs(outputs)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(warnings), 1)
+        self.assertIn('p90', warnings[0])
+
     def test_warning_functions(self):
         topic_d = STATUS_TOPIC
         data = generate_test_data()
@@ -243,3 +437,65 @@ class DataToolsTest(TestCase):
 
             if expected:
                 self.assertEqual(warnings[0], "Test warning")
+
+
+class BackendTest(TestCase):
+    def setUp(self):
+        self.backend = get_backend()
+
+    def tearDown(self):
+        set_backend(self.backend)
+
+    def assertAlmostEqualResults(self, first, second):
+        self.assertEqual(type(first), type(second))
+        if isinstance(first, float):
+            self.assertAlmostEqual(first, second, delta=abs(first) * 1e-12)
+        elif isinstance(first, dict):
+            self.assertEqual(first.keys(), second.keys())
+            for key in first:
+                self.assertAlmostEqualResults(first[key], second[key])
+        elif isinstance(first, (list, tuple)):
+            self.assertEqual(len(first), len(second))
+            for a, b in zip(first, second):
+                self.assertAlmostEqualResults(a, b)
+        else:
+            self.assertEqual(first, second)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            set_backend('fortran')
+        if not numpy:
+            with self.assertRaises(ValueError):
+                set_backend('numpy')
+
+    @skipUnless(numpy, "NumPy is not installed")
+    def test_numpy_backend_matches_python_backend(self):
+        random = Random(1)
+        methods = ['average', 'max', 'mean', 'median', 'min', 'sum', 'latest']
+        topic_d = dict(STATUS_TOPIC, data_tools=[
+            dict(field=field, method=method)
+            for field in ('number', 'number2') for method in methods] + [
+            dict(field='number', method='doughnut'),
+            dict(field='number2', method='table_item', parameters=dict(
+                method='median', name='Median')),
+        ])
+
+        for values in [
+                [1, 2, 3],
+                [0.1, 2.5, 1e300, -3],
+                [1, 2.5, 3, 3.0, -4],
+                [1, 2.5, None, 'a'],
+                [True, 2],
+                [2**64, 1],
+                [None]]:
+            data = generate_random_data(random, 300, values)
+            outputs = []
+            for backend in ('numpy', 'python'):
+                set_backend(backend)
+                outputs.append((
+                    run_data_tools(topic_d, data),
+                    [aggregate(data, 7, method) for method in methods],
+                    aggregate(data[:1], 3, aggregate_always=True),
+                ))
+
+            self.assertAlmostEqualResults(*outputs)
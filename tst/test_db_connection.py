@@ -1,4 +1,5 @@
 from datetime import datetime
+from time import monotonic, sleep
 from unittest import TestCase
 
 from unittest.mock import Mock, patch
@@ -157,6 +158,19 @@ class DBConnectionTest(TestCase):
         latest = C.get_latest(topic_id)
         self.assertEqual(latest["number"], 1)
 
+    def test_get_latest_does_not_read_all_data(self):
+        C = DictConnection()
+        topic_id = C.add_topic("topic", fields=["number"])
+        empty_id = C.add_topic("empty", fields=["number"])
+        for i in range(3):
+            C.add_data(topic_id, {"number": i})
+
+        with patch.object(C, 'get_data', side_effect=AssertionError):
+            self.assertEqual(C.get_latest(topic_id)["number"], 2)
+            self.assertEqual(
+                C.get_latest_many([topic_id, empty_id]),
+                {topic_id: C.get_latest(topic_id), empty_id: None})
+
     def test_last_truthy_falsy_summary_returns_correct_timestamp(self):
         data_tools = [
             {"field":"onoff", "method":"last_truthy"},
@@ -323,3 +337,214 @@ class DBConnectionTest(TestCase):
         data = C.get_overview()
         self.assertEqual(len(data["warnings"]), 1)
         self.assertNotIn(data["warnings"][0], "template")
+
+    def test_get_topic_cache_is_invalidated_on_template_overwrite(self):
+        C = DictConnection()
+        C.add_topic("base", type_str="template", fields=["number"])
+        C.add_topic("template", type_str="template", template="base")
+        topic_id = C.add_topic("topic", template="template")
+
+        self.assertEqual(C.get_topic(topic_id)["fields"], ["number"])
+        with patch.object(C, 'get_topic_without_templates') as get_mock:
+            C.get_topic(topic_id)
+            get_mock.assert_not_called()
+
+        C.add_topic(
+            "base", type_str="template", fields=["value"], overwrite=True)
+        self.assertEqual(C.get_topic(topic_id)["fields"], ["value"])
+        self.assertEqual(C.get_topics()[-1]["fields"], ["value"])
+
+    def _create_overview_topics(self, C):
+        data_tools = [{"field":"number", "method":"latest"}]
+        topic_ids = [
+            C.add_topic(name, fields=["number"], data_tools=data_tools)
+            for name in ("fast", "slow")]
+        for topic_id in topic_ids:
+            C.add_data(topic_id, {"number": 1})
+        return topic_ids
+
+    def test_overview_executor_is_reused_and_closed(self):
+        C = DictConnection(executor_workers="2", executor_pending="1")
+        self._create_overview_topics(C)
+
+        self.assertEqual(len(C.get_overview()["statistics"]), 2)
+        executor = C._executor
+        self.assertEqual(len(C.get_overview()["statistics"]), 2)
+        self.assertIs(C._executor, executor)
+
+        C.close()
+        self.assertIsNone(C._executor)
+
+        with self.assertRaises(ValueError):
+            C.configure_executor("fiber")
+
+    def test_overview_timeout_returns_partial_results(self):
+        C = DictConnection(overview_timeout="0.1")
+        fast_id, slow_id = self._create_overview_topics(C)
+        get_topic_statistics = C._get_topic_statistics
+
+        def slow_statistics(topic_d, *args):
+            if topic_d["id"] == slow_id:
+                sleep(0.5)
+            return get_topic_statistics(topic_d, *args)
+
+        with patch.object(C, '_get_topic_statistics', side_effect=slow_statistics):
+            result = C.get_overview()
+        C.close()
+
+        self.assertEqual(len(result["statistics"]), 1)
+        self.assertEqual(result["statistics"][0]["payload"]["topic_name"], "fast")
+        self.assertIn("slow", result["warnings"][0])
+        self.assertEqual(result["topic_names"], ["fast"])
+
+    def test_overview_timeout_covers_reading_data(self):
+        C = DictConnection(overview_timeout="0.1")
+        data_tools = [{"field":"number", "method":"median"}]
+        fast_id, slow_id = [
+            C.add_topic(name, fields=["number"], data_tools=data_tools)
+            for name in ("fast", "slow")]
+        get_data = C.get_data
+
+        def slow_data(topic_id, *args):
+            if topic_id == slow_id:
+                sleep(0.5)
+            return get_data(topic_id, *args)
+
+        with patch.object(C, 'get_data', side_effect=slow_data):
+            result = C.get_overview()
+        C.close()
+
+        self.assertEqual(result["topic_names"], ["fast"])
+        self.assertIn("slow", result["warnings"][0])
+
+    def test_overview_timeout_while_waiting_for_executor(self):
+        C = DictConnection(
+            executor_workers="1", executor_pending="1", overview_timeout="0.1")
+        fast_id, slow_id = self._create_overview_topics(C)
+        get_topic_statistics = C._get_topic_statistics
+
+        def slow_statistics(topic_d, *args):
+            sleep(0.5)
+            return get_topic_statistics(topic_d, *args)
+
+        with patch.object(C, '_get_topic_statistics', side_effect=slow_statistics):
+            result = C.get_overview()
+        C.close()
+
+        self.assertEqual(result["statistics"], [])
+        self.assertEqual(result["topic_names"], [])
+        self.assertEqual(len(result["warnings"]), 2)
+
+    def test_executor_state_is_not_shared(self):
+        A = DictConnection(executor_workers="1")
+        B = DictConnection()
+
+        self.assertIsNot(A._executor_lock, B._executor_lock)
+        self.assertIs(A._executor_lock, A._executor_lock)
+        self.assertEqual(A._executor_option("max_workers"), 1)
+        self.assertIsNone(B._executor_option("max_workers"))
+
+    def test_overview_with_process_executor(self):
+        C = DictConnection(executor="process", executor_workers="1")
+        self._create_overview_topics(C)
+        result = C.get_overview()
+        C.close()
+
+        self.assertEqual(len(result["statistics"]), 2)
+
+    def test_iter_overview_yields_topics_as_they_finish(self):
+        C = DictConnection()
+        fast_id, slow_id = self._create_overview_topics(C)
+        get_topic_statistics = C._get_topic_statistics
+
+        def slow_statistics(topic_d, *args):
+            if topic_d["id"] == slow_id:
+                sleep(0.2)
+            return get_topic_statistics(topic_d, *args)
+
+        with patch.object(C, '_get_topic_statistics', side_effect=slow_statistics):
+            items = list(C.iter_overview())
+        overview = C.get_overview()
+        C.close()
+
+        self.assertEqual([i["type"] for i in items], ["topic", "topic", "overview"])
+        self.assertEqual([i.get("topic_id") for i in items[:2]], [fast_id, slow_id])
+        self.assertEqual(items[0]["statistics"][0]["payload"]["topic_name"], "fast")
+        self.assertEqual(items[-1]["overview"], overview)
+
+    def test_overview_reuses_statistics_of_unchanged_topics(self):
+        C = DictConnection()
+        fast_id, slow_id = self._create_overview_topics(C)
+
+        with patch.object(
+                C, '_get_topic_statistics',
+                wraps=C._get_topic_statistics) as statistics_mock:
+            overview = C.get_overview()
+            self.assertEqual(C.get_overview(), overview)
+            self.assertEqual(statistics_mock.call_count, 2)
+
+            C.add_data(slow_id, {"number": 2})
+            overview = C.get_overview()
+            self.assertEqual(statistics_mock.call_count, 3)
+            self.assertEqual(
+                statistics_mock.call_args[0][0]["id"], slow_id)
+            values = {
+                i["payload"]["topic_name"]: i["payload"]["value"]
+                for i in overview["statistics"]}
+            self.assertEqual(values, {"fast": 1, "slow": 2})
+
+            C.get_overview(limit=1)
+            self.assertEqual(statistics_mock.call_count, 5)
+        C.close()
+
+    def test_overview_reuses_statistics_of_topics_with_max_age(self):
+        C = DictConnection()
+        topic_id = C.add_topic(
+            "topic",
+            fields=["number"],
+            data_tools=[{"field": "number", "method": "latest"}],
+            metadata=dict(retention=dict(max_age=3600)))
+        C.add_data(topic_id, {"number": 1})
+
+        with patch.object(
+                C, '_get_topic_statistics',
+                wraps=C._get_topic_statistics) as statistics_mock:
+            C.get_overview()
+            C.get_overview()
+            self.assertEqual(statistics_mock.call_count, 1)
+        C.close()
+
+    def test_summary_cache(self):
+        C = DictConnection(summary_cache_size="2")
+        topic_id = C.add_topic("topic", fields=["number"], data_tools=[{"field":"number", "method":"latest"}])
+        C.add_data(topic_id, {"number": 1})
+
+        with patch.object(C, '_get_data_for_tools', wraps=C._get_data_for_tools) as data_mock:
+            summary = C.get_summary(topic_id)
+            self.assertEqual(C.get_summary(topic_id), summary)
+            self.assertEqual(data_mock.call_count, 1)
+
+            C.add_data(topic_id, {"number": 2})
+            summary = C.get_summary(topic_id)
+            self.assertEqual(summary["statistics"][0]["payload"]["value"], 2)
+            self.assertEqual(data_mock.call_count, 2)
+
+            C.add_topic("topic", id_str=topic_id, description="changed", fields=["number"], overwrite=True)
+            self.assertEqual(C.get_summary(topic_id)["description"], "changed")
+            self.assertEqual(data_mock.call_count, 3)
+
+            C.get_summary(topic_id, since=datetime(2020, 1, 1, 0, 0, 1))
+            C.get_summary(topic_id, since=datetime(2020, 1, 1, 0, 0, 2))
+            self.assertEqual(data_mock.call_count, 5)
+
+            C.configure_summary_cache(max_age=3600)
+            C.get_summary(topic_id, since=datetime(2020, 1, 1, 0, 0, 1))
+            C.get_summary(topic_id, since=datetime(2020, 1, 1, 0, 0, 1))
+            self.assertEqual(data_mock.call_count, 6)
+            C.get_summary(topic_id, since=datetime(2020, 1, 1, 0, 0, 2))
+            self.assertEqual(data_mock.call_count, 7)
+
+            later = monotonic() + 3601
+            with patch('fdbk._db_connection.monotonic', return_value=later):
+                C.get_summary(topic_id, since=datetime(2020, 1, 1, 0, 0, 2))
+            self.assertEqual(data_mock.call_count, 8)
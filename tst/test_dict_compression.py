@@ -0,0 +1,49 @@
+from random import Random
+from unittest import TestCase
+
+from fdbk._dict_compression import (
+    decode_floats,
+    decode_ints,
+    encode_floats,
+    encode_ints)
+
+
+class CompressionTest(TestCase):
+    def test_ints_roundtrip(self):
+        random = Random(0)
+        tests = (
+            [],
+            [5],
+            [1, 2],
+            [0, 10**6, 2 * 10**6, 3 * 10**6 + 5, 2**40, -2**40, 7],
+            [random.randint(-2**40, 2**40) for _ in range(100)],
+            [i * 60000000 + random.randint(-5000, 5000) for i in range(100)],
+        )
+        for values in tests:
+            decoded = decode_ints(encode_ints(values), len(values))
+            self.assertEqual(list(decoded), values)
+
+    def test_floats_roundtrip(self):
+        random = Random(0)
+        tests = (
+            [],
+            [1.5],
+            [20.0] * 10,
+            [20.0 + random.random() * 0.1 for _ in range(100)],
+            [random.uniform(-1e300, 1e300) for _ in range(100)],
+            [0.0, -0.0, 1e-300, float('inf')],
+        )
+        for values in tests:
+            decoded = decode_floats(encode_floats(values), len(values))
+            self.assertEqual(list(decoded), values)
+
+    def test_regular_series_compress_well(self):
+        timestamps = [1577840400000000 + i * 60000000 for i in range(1000)]
+        values = [20.5] * 500 + [21.0] * 500
+
+        self.assertLess(len(encode_ints(timestamps)), 200)
+        self.assertLess(len(encode_floats(values)), 200)
+
+    def test_ints_with_too_large_deltas_raise_value_error(self):
+        with self.assertRaises(ValueError):
+            encode_ints([-2**63, 2**63 - 1])
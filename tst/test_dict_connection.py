@@ -1,4 +1,7 @@
 import os
+import shutil
+from datetime import datetime, timedelta, timezone
+from threading import Thread
 from unittest import TestCase
 from uuid import uuid4
 
@@ -8,6 +11,9 @@ except ImportError:
     from mock import Mock, patch
 
 from fdbk import DictConnection
+from fdbk._dict_segments import Segment
+from fdbk._dict_storage import timestamp_to_us
+from fdbk.data_tools import aggregate, VALUE_FUNCS
 from fdbk.utils import CommonTest
 
 class DictConnectionCommonTest(CommonTest, TestCase):
@@ -38,3 +44,528 @@ class DictConnectionTest(TestCase):
         C._dict['topics'] = C._dict['topics'][1:]
         with self.assertRaises(KeyError):
             C.get_topics()
+
+    def test_topics_backup_topics_accept_data_after_load(self):
+        filename = f'/tmp/{uuid4()}.json'
+        C1 = DictConnection(filename)
+        topic_id = C1.add_topic('Test topic', fields=['number'])
+
+        C2 = DictConnection(filename)
+        C2.add_data(topic_id, {'number': 3})
+        C2.add_topic(
+            'Test topic', fields=['number'], id_str=topic_id, overwrite=True)
+
+        os.remove(filename)
+
+        self.assertEqual(len(C2.get_topics()), 1)
+        self.assertEqual(C2.get_data(topic_id)[0]['number'], 3)
+
+    def test_out_of_order_data_is_returned_sorted(self):
+        C = DictConnection()
+        topic_id = C.add_topic('topic', fields=['number'])
+        for minute in (5, 1, 3, 2, 4):
+            C.add_data(topic_id, {
+                'number': minute,
+                'timestamp': datetime(2020, 1, 1, 1, minute)})
+
+        self.assertEqual(
+            [i['number'] for i in C.get_data(topic_id)], [1, 2, 3, 4, 5])
+        self.assertEqual(
+            [i['number'] for i in C.get_data(
+                topic_id,
+                since=datetime(2020, 1, 1, 1, 2),
+                until=datetime(2020, 1, 1, 1, 4))],
+            [2, 3, 4])
+        self.assertEqual(
+            [i['number'] for i in C.get_data(topic_id, limit=2)], [4, 5])
+
+        with self.assertRaises(AssertionError):
+            C.add_data(topic_id, {
+                'number': 6, 'timestamp': datetime(2020, 1, 1, 1, 3)})
+
+    def test_data_log_restores_topics_and_data(self):
+        filename = f'/tmp/{uuid4()}.log'
+        C1 = DictConnection(data_log=filename)
+        topic_id = C1.add_topic('topic', fields=['number'])
+        C1.add_data(topic_id, {
+            'number': 3, 'timestamp': datetime(2020, 1, 1, 1, 1)})
+        C1.add_data(topic_id, {
+            'number': 4, 'timestamp': datetime(2020, 1, 1, 1, 1)},
+            overwrite=True)
+        C1.add_data(topic_id, {
+            'number': 5, 'timestamp': datetime(2020, 1, 1, 1, 0)})
+        C1.close()
+
+        with open(filename, 'a') as f:
+            f.write('{"data": {"topic_')
+
+        C2 = DictConnection(data_log=filename, log_fsync_every='10')
+        C2.add_data(topic_id, {
+            'number': 6, 'timestamp': datetime(2020, 1, 1, 1, 2)})
+        C2.close()
+
+        C3 = DictConnection(data_log=filename)
+        data = C3.get_data(topic_id)
+        C3.close()
+
+        os.remove(filename)
+
+        self.assertEqual(len(C3.get_topics()), 1)
+        self.assertEqual([i['number'] for i in data], [5, 4, 6])
+        self.assertEqual(data[0]['timestamp'], '2020-01-01T01:00:00Z')
+
+    def test_snapshot_compacts_data_log(self):
+        filename = f'/tmp/{uuid4()}.log'
+        C1 = DictConnection(data_log=filename)
+        topic_id = C1.add_topic('topic', fields=['number'])
+        for i in range(5):
+            C1.add_data(topic_id, {
+                'number': i, 'timestamp': datetime(2020, 1, 1, 1, i)})
+
+        C1.snapshot()
+        self.assertFalse(os.path.exists(filename))
+
+        C1.add_data(topic_id, {
+            'number': 5, 'timestamp': datetime(2020, 1, 1, 1, 5)})
+        C1.close()
+
+        with open(filename) as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+        C2 = DictConnection(data_log=filename)
+        data = C2.get_data(topic_id)
+        C2.close()
+
+        os.remove(filename)
+        os.remove(f'{filename}.snapshot')
+
+        self.assertEqual([i['number'] for i in data], list(range(6)))
+        self.assertEqual(data[0]['timestamp'], '2020-01-01T01:00:00Z')
+
+    def test_naive_and_aware_timestamps_can_be_mixed(self):
+        C = DictConnection()
+        topic_id = C.add_topic('topic', fields=['number'])
+        created = C.add_data(topic_id, {
+            'number': 1,
+            'timestamp': datetime(2020, 1, 1, 3, 0, tzinfo=timezone(
+                timedelta(hours=2)))})
+        C.add_data(topic_id, {'number': 2})
+        C.add_data(topic_id, {
+            'number': 0, 'timestamp': datetime(2020, 1, 1, 0, 0)})
+
+        self.assertEqual(created, '2020-01-01T01:00:00Z')
+        self.assertEqual(
+            [i['number'] for i in C.get_data(topic_id)], [0, 1, 2])
+
+        data = C.get_data(
+            topic_id,
+            since=datetime(2020, 1, 1, 1, 0, tzinfo=timezone.utc),
+            until=datetime(2020, 1, 1, 2, 0))
+        self.assertEqual([i['number'] for i in data], [1])
+
+        with self.assertRaises(AssertionError):
+            C.add_data(topic_id, {
+                'number': 3,
+                'timestamp': datetime(2020, 1, 1, 1, 0, tzinfo=timezone.utc)})
+
+    def test_overlapping_snapshots_keep_all_data(self):
+        filename = f'/tmp/{uuid4()}.log'
+        C1 = DictConnection(data_log=filename, snapshot_interval=0.001)
+        topic_id = C1.add_topic('topic', fields=['number'])
+        for i in range(200):
+            C1.add_data(topic_id, {
+                'number': i, 'timestamp': datetime(2020, 1, 1) + timedelta(
+                    minutes=i)})
+            if not i % 20:
+                C1.snapshot()
+        C1.close()
+
+        C2 = DictConnection(data_log=filename)
+        data = C2.get_data(topic_id)
+        C2.close()
+
+        for suffix in ('', '.old', '.snapshot'):
+            if os.path.exists(f'{filename}{suffix}'):
+                os.remove(f'{filename}{suffix}')
+
+        self.assertEqual([i['number'] for i in data], list(range(200)))
+
+    def test_overwrite_after_topic_fields_change(self):
+        C = DictConnection()
+        topic_id = C.add_topic('topic', fields=['number', 'other'])
+        timestamp = datetime(2020, 1, 1)
+        C.add_data(topic_id, {
+            'number': 1, 'other': 2, 'timestamp': timestamp})
+
+        C.add_topic('topic', fields=['number'], id_str=topic_id, overwrite=True)
+        C.add_data(topic_id, {
+            'number': 1.5, 'timestamp': timestamp}, overwrite=True)
+
+        self.assertEqual(C.get_data(topic_id)[0]['number'], 1.5)
+
+    def test_segments_store_sealed_data_in_files(self):
+        directory = f'/tmp/{uuid4()}'
+        os.makedirs(directory)
+        C1 = DictConnection(
+            data_log=f'{directory}/data.log',
+            segment_dir=directory,
+            segment_size='4')
+        topic_id = C1.add_topic('topic', fields=['number', 'letter'])
+        for i in range(10):
+            C1.add_data(topic_id, {
+                'number': i,
+                'letter': None if i % 3 else 'a',
+                'timestamp': datetime(2020, 1, 1, 1, 2 * i)})
+        C1.snapshot()
+
+        store = C1._dict[topic_id]
+        self.assertEqual(len(store.segments), 2)
+        self.assertEqual(len(store.hot), 2)
+
+        C1.add_data(topic_id, {
+            'number': 10,
+            'letter': 'b',
+            'timestamp': datetime(2020, 1, 1, 1, 3)})
+        with self.assertRaises(AssertionError):
+            C1.add_data(topic_id, {
+                'number': 11,
+                'letter': 'c',
+                'timestamp': datetime(2020, 1, 1, 1, 4)})
+        C1.add_data(topic_id, {
+            'number': 12,
+            'letter': 'c',
+            'timestamp': datetime(2020, 1, 1, 1, 4)}, overwrite=True)
+        C1.close()
+
+        C2 = DictConnection(
+            data_log=f'{directory}/data.log',
+            segment_dir=directory,
+            segment_size='4')
+        data = C2.get_data(topic_id)
+        filtered = C2.get_data(
+            topic_id,
+            since=datetime(2020, 1, 1, 1, 3),
+            until=datetime(2020, 1, 1, 1, 10),
+            limit=3)
+        C2.close()
+        shutil.rmtree(directory)
+
+        self.assertEqual(
+            [i['number'] for i in data], [0, 1, 10, 12, 3, 4, 5, 6, 7, 8, 9])
+        self.assertEqual(
+            [i['letter'] for i in data][:5], ['a', None, 'b', 'c', 'a'])
+        self.assertEqual([i['number'] for i in filtered], [3, 4, 5])
+
+    def test_compressed_segments(self):
+        filename = f'/tmp/{uuid4()}.log'
+        C1 = DictConnection(
+            data_log=filename, segment_size=100, compression='gorilla')
+        topic_id = C1.add_topic('topic', fields=['number', 'value'])
+        for i in range(250):
+            C1.add_data(topic_id, {
+                'number': i,
+                'value': 20.5 if i < 200 else None,
+                'timestamp': datetime(2020, 1, 1) + timedelta(minutes=i)})
+        C1.add_data(topic_id, {
+            'number': 1.5,
+            'value': 'a',
+            'timestamp': datetime(2020, 1, 1, 0, 1)}, overwrite=True)
+
+        stats = C1.get_storage_stats(topic_id)
+        self.assertEqual(stats['num_points'], 250)
+        self.assertEqual(stats['num_segments'], 2)
+        self.assertGreater(stats['compression_ratio'], 2)
+
+        C1.snapshot()
+        C1.close()
+
+        C2 = DictConnection(
+            data_log=filename, segment_size=100, compression='gorilla')
+        data = C2.get_data(topic_id)
+        limited = C2.get_data(topic_id, until=datetime(2020, 1, 1, 1, 42),
+                              limit=4)
+        C2.close()
+        os.remove(f'{filename}.snapshot')
+
+        self.assertEqual(len(data), 250)
+        self.assertEqual(data[1]['number'], 1.5)
+        self.assertEqual(data[1]['value'], 'a')
+        self.assertEqual(data[2]['value'], 20.5)
+        self.assertIsNone(data[-1]['value'])
+        self.assertEqual([i['number'] for i in limited], [99, 100, 101, 102])
+
+    def test_duplicate_checks_do_not_decode_compressed_segments(self):
+        C = DictConnection(segment_size=100, compression='gorilla')
+        topic_id = C.add_topic('topic', fields=['number'])
+        start = datetime(2020, 1, 1)
+        for i in range(0, 500, 2):
+            C.add_data(topic_id, {
+                'number': i, 'timestamp': start + timedelta(minutes=i)})
+
+        with patch.object(
+                Segment, 'to_topic_data', side_effect=RuntimeError):
+            for i in range(0, 10, 2):
+                with self.assertRaises(AssertionError):
+                    C.add_data(topic_id, {
+                        'number': i,
+                        'timestamp': start + timedelta(minutes=i)})
+            self.assertFalse(C._dict[topic_id].contains(
+                timestamp_to_us(start + timedelta(minutes=1))))
+
+        C.add_data(topic_id, {
+            'number': -1, 'timestamp': start + timedelta(minutes=1)})
+        data = C.get_data(
+            topic_id, until=start + timedelta(minutes=2), limit=3)
+        self.assertEqual([i['number'] for i in data], [0, -1, 2])
+
+    def test_retention_max_points_from_template(self):
+        C = DictConnection(segment_size=10, compression='gorilla')
+        C.add_topic(
+            'template',
+            type_str='template',
+            fields=['number'],
+            metadata=dict(retention=dict(max_points=25)))
+        topic_id = C.add_topic('topic', template='template')
+        for i in range(100):
+            C.add_data(topic_id, {
+                'number': i,
+                'timestamp': datetime(2020, 1, 1) + timedelta(minutes=i)})
+
+        data = C.get_data(topic_id)
+        self.assertEqual([i['number'] for i in data], list(range(75, 100)))
+        self.assertLess(C.get_storage_stats(topic_id)['num_points'], 50)
+
+        with self.assertRaises(AssertionError):
+            C.add_data(topic_id, {
+                'number': -1,
+                'timestamp': datetime(2020, 1, 1)})
+        results = C.add_data_many([dict(
+            topic_id=topic_id, number=-1, timestamp=datetime(2020, 1, 1))])
+        self.assertIn('error', results[0])
+        self.assertEqual(C.get_data(topic_id, limit=30), data)
+
+    def test_retention_max_age(self):
+        C = DictConnection()
+        topic_id = C.add_topic(
+            'topic',
+            fields=['number'],
+            metadata=dict(retention=dict(max_age=4 * 3600)))
+        now = datetime.utcnow()
+        for i in range(10):
+            C.add_data(topic_id, {
+                'number': i,
+                'timestamp': now - timedelta(minutes=20 * (9 - i))})
+
+        later = now + timedelta(hours=3)
+        with patch('fdbk._dict_segments.datetime') as datetime_mock:
+            datetime_mock.utcnow.return_value = later
+            C.add_data(topic_id, {'number': 10, 'timestamp': later})
+            data = C.get_data(topic_id)
+
+            with self.assertRaises(AssertionError):
+                C.add_data(topic_id, {
+                    'number': -1, 'timestamp': now - timedelta(minutes=90)})
+
+        self.assertEqual([i['number'] for i in data], [6, 7, 8, 9, 10])
+        self.assertLessEqual(len(C._dict[topic_id].hot), 6)
+
+    def test_value_statistics_are_skipped_without_value_tools(self):
+        C = DictConnection()
+        topic_id = C.add_topic(
+            'topic',
+            fields=['number'],
+            data_tools=[dict(field='number', method='line')])
+        C.add_data(topic_id, {'number': 1})
+
+        with patch('fdbk._dict_connection.summarize_rollups') as rollups_mock:
+            summary = C.get_summary(topic_id)
+            C.get_summary(topic_id, aggregate_to=10)
+
+        rollups_mock.assert_not_called()
+        self.assertEqual(summary['num_entries'], 1)
+
+    def test_summary_is_aggregated_from_rollups(self):
+        C = DictConnection()
+        topic_id = C.add_topic(
+            'topic',
+            fields=['number'],
+            data_tools=[dict(field='number', method='line')])
+        start = datetime(2020, 1, 1)
+        for i in range(1440):
+            C.add_data(topic_id, {
+                'number': i % 7,
+                'timestamp': start + timedelta(minutes=10 * i)})
+        C.add_data(topic_id, {
+            'number': 100,
+            'timestamp': start + timedelta(hours=30)}, overwrite=True)
+
+        data = C.get_data(topic_id)
+        for method in ('average', 'max', 'min', 'sum', 'latest'):
+            with patch.object(C, 'get_data', side_effect=AssertionError):
+                summary = C.get_summary(
+                    topic_id, aggregate_to=10, aggregate_with=method)
+            expected, _ = aggregate(data, 10, method)
+
+            self.assertEqual(summary['num_entries'], 1440)
+            chart = summary['statistics'][0]['payload']['data']
+            self.assertEqual(
+                chart['datasets'][0]['data'],
+                [{'x': i['timestamp'], 'y': i['number']} for i in expected])
+
+        summary = C.get_summary(
+            topic_id,
+            since=start + timedelta(hours=5, minutes=5),
+            aggregate_to=5)
+        self.assertEqual(summary['num_entries'], 1440 - 31)
+        chart = summary['statistics'][0]['payload']['data']
+        self.assertEqual(len(chart['datasets'][0]['data']), 5)
+
+    def test_rollup_tiers_keep_value_types(self):
+        C = DictConnection()
+        topic_id = C.add_topic('topic', fields=['number', 'letter'])
+        start = datetime(2020, 1, 1)
+        values = ['a', 1, 2.5, 3, None, 4]
+        for i, value in enumerate(values * 100):
+            C.add_data(topic_id, {
+                'number': value,
+                'letter': chr(ord('a') + i % 26),
+                'timestamp': start + timedelta(minutes=i)})
+
+        data = C.get_data(topic_id)
+        topic_d = C.get_topic(topic_id)
+        for method in ('max', 'min', 'sum', 'latest'):
+            expected, _ = aggregate(data, 3, method)
+            _, aggregated = C._get_aggregated_data(
+                topic_d, aggregate_to=3, aggregate_with=method)
+            self.assertEqual(
+                [[type(i[k]) for k in ('number', 'letter')]
+                 for i in aggregated],
+                [[type(i[k]) for k in ('number', 'letter')]
+                 for i in expected])
+            self.assertEqual(aggregated, expected)
+
+        tier = C._dict[topic_id].rollups.tiers[0]
+        self.assertIsNone(tier.last['letter'].typecode)
+        self.assertEqual(tier.stats['number'][0].typecode, 'q')
+
+    def test_value_statistics_from_running_totals(self):
+        C = DictConnection()
+        methods = ('average', 'latest', 'max', 'mean', 'min', 'sum')
+        topic_id = C.add_topic(
+            'topic',
+            fields=['number'],
+            data_tools=[dict(field='number', method=i) for i in methods])
+        start = datetime(2020, 1, 1)
+        for i in reversed(range(500)):
+            C.add_data(topic_id, {
+                'number': i % 13 / 2,
+                'timestamp': start + timedelta(seconds=37 * i)})
+        C.add_data(topic_id, {
+            'number': 100,
+            'timestamp': start + timedelta(seconds=37 * 10)}, overwrite=True)
+
+        ranges = [
+            (None, None),
+            (start + timedelta(hours=1), None),
+            (start + timedelta(minutes=7, seconds=3),
+             start + timedelta(hours=3, minutes=1, seconds=2)),
+        ]
+        for since, until in ranges:
+            data = C.get_data(topic_id, since, until)
+            with patch.object(C, 'get_data', side_effect=AssertionError):
+                summary = C.get_summary(topic_id, since, until)
+
+            self.assertEqual(summary['num_entries'], len(data))
+            self.assertEqual(
+                [i['payload']['value'] for i in summary['statistics']],
+                [VALUE_FUNCS[i](data, 'number')['payload']['value']
+                 for i in methods])
+
+        summary = C.get_summary(topic_id, since=start + timedelta(days=1))
+        self.assertEqual(summary['num_entries'], 0)
+        self.assertEqual(len(summary['warnings']), 1)
+
+    def test_percentiles_from_rollup_sketches(self):
+        C = DictConnection(quantile_accuracy='0.01')
+        data_tools = [
+            dict(field='number', method='p95'),
+            dict(field='number', method='p99'),
+            dict(field='number', method='percentile', parameters=dict(
+                percentile=25)),
+        ]
+        topic_id = C.add_topic(
+            'topic', fields=['number'], data_tools=data_tools)
+        start = datetime(2020, 1, 1)
+        for i in reversed(range(500)):
+            C.add_data(topic_id, {
+                'number': (i * 7919) % 1000 - 100,
+                'timestamp': start + timedelta(seconds=37 * i)})
+        C.add_data(topic_id, {
+            'number': 5000,
+            'timestamp': start + timedelta(seconds=37 * 10)}, overwrite=True)
+
+        for since, until in [
+                (None, None),
+                (start + timedelta(minutes=7, seconds=3),
+                 start + timedelta(hours=3, minutes=1, seconds=2))]:
+            numbers = sorted(
+                i['number'] for i in C.get_data(topic_id, since, until))
+            with patch.object(C, 'get_data', side_effect=AssertionError):
+                summary = C.get_summary(topic_id, since, until)
+
+            for statistic, q in zip(summary['statistics'], (95, 99, 25)):
+                exact = numbers[int(q / 100 * (len(numbers) - 1))]
+                self.assertEqual(statistic['payload']['percentile'], q)
+                self.assertLessEqual(
+                    abs(statistic['payload']['value'] - exact),
+                    0.01 * abs(exact))
+                self.assertNotIn('sketch', statistic['payload'])
+
+        # Sketches are not accurate enough for the data tool
+        parameters = dict(accuracy=0.001)
+        topic_id = C.add_topic('topic 2', fields=['number'], data_tools=[
+            dict(field='number', method='p95', parameters=parameters)])
+        for i in range(10):
+            C.add_data(topic_id, {
+                'number': i, 'timestamp': start + timedelta(seconds=i)})
+        summary = C.get_summary(topic_id)
+        self.assertEqual(
+            summary['statistics'][0]['payload']['value'],
+            VALUE_FUNCS['p95'](
+                C.get_data(topic_id), 'number', parameters)['payload']['value'])
+
+    def test_concurrent_writes(self):
+        directory = f'/tmp/{uuid4()}'
+        os.makedirs(directory)
+        filename = f'{directory}/data.log'
+        C = DictConnection(data_log=filename, log_fsync_every=1000)
+        topic_ids = [
+            C.add_topic(f'topic {i}', fields=['number']) for i in range(4)]
+        timestamps = [datetime(2020, 1, 1, 0, i) for i in range(50)]
+        added = []
+
+        def writer(topic_id):
+            for timestamp in timestamps:
+                try:
+                    C.add_data(topic_id, {
+                        'number': 1, 'timestamp': timestamp})
+                    added.append(topic_id)
+                except AssertionError:
+                    pass
+
+        threads = [
+            Thread(target=writer, args=(topic_id,))
+            for topic_id in topic_ids * 4]
+        for thread in threads:
+            thread.start()
+        C.snapshot()
+        for thread in threads:
+            thread.join()
+        C.close()
+
+        self.assertEqual(len(added), 200)
+        C2 = DictConnection(data_log=filename)
+        for topic_id in topic_ids:
+            self.assertEqual(len(C2.get_data(topic_id)), 50)
+        C2.close()
+        shutil.rmtree(directory)
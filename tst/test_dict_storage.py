@@ -0,0 +1,72 @@
+from unittest import TestCase
+
+from fdbk._dict_storage import Column, TopicData
+
+
+class ColumnTest(TestCase):
+    def test_numeric_values_are_stored_in_typed_arrays(self):
+        column = Column()
+        column.insert(0, 1)
+        self.assertEqual(column.typecode, 'q')
+
+        column.insert(1, 1.5)
+        self.assertEqual(column.typecode, 'd')
+        column.insert(2, 2)
+        self.assertEqual(column.typecode, 'd')
+        self.assertEqual(column[:], [1.0, 1.5, 2.0])
+
+    def test_missing_values_keep_column_typed(self):
+        column = Column.empty(2)
+        column.insert(2, 3)
+        column.insert(3, None)
+        column.set(0, 1)
+
+        self.assertEqual(column.typecode, 'q')
+        self.assertEqual(column[:], [1, None, 3, None])
+        self.assertIsNone(Column().missing)
+
+    def test_other_values_fall_back_to_list(self):
+        column = Column()
+        column.insert(0, 1)
+        column.insert(1, None)
+        column.insert(2, True)
+        column.insert(3, 'a')
+
+        self.assertIsNone(column.typecode)
+        self.assertEqual(column[:], [1, None, True, 'a'])
+
+    def test_large_ints_are_not_promoted_to_float(self):
+        column = Column()
+        column.insert(0, 2**60 + 1)
+        column.insert(1, 0.5)
+
+        self.assertIsNone(column.typecode)
+        self.assertEqual(column[:], [2**60 + 1, 0.5])
+
+
+class TopicDataTest(TestCase):
+    def test_rows_are_built_from_columns(self):
+        topic_data = TopicData('topic')
+        for timestamp_us in (2, 0, 1):
+            i, found = topic_data.find(timestamp_us)
+            self.assertFalse(found)
+            topic_data.put(i, found, timestamp_us, {'number': timestamp_us})
+
+        topic_data.put(*topic_data.find(3), 3, {'letter': 'a'})
+        topic_data.put(*topic_data.find(1), 1, {'letter': 'b'})
+
+        rows = topic_data.rows(*topic_data.range(), ['number', 'letter'])
+        self.assertEqual(
+            [(i['number'], i['letter']) for i in rows],
+            [(0, None), (None, 'b'), (2, None), (None, 'a')])
+        self.assertEqual(rows[0]['timestamp'], '1970-01-01T00:00:00Z')
+        self.assertEqual(topic_data.columns['number'].typecode, 'q')
+
+    def test_range_filters_by_timestamp_and_limit(self):
+        topic_data = TopicData('topic')
+        for timestamp_us in range(10):
+            topic_data.put(timestamp_us, False, timestamp_us, {'number': 1})
+
+        self.assertEqual(topic_data.range(3, 6), (3, 7))
+        self.assertEqual(topic_data.range(3, 6, 2), (5, 7))
+        self.assertEqual(topic_data.range(8, 2), (8, 8))
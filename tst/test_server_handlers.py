@@ -1,4 +1,5 @@
 from datetime import datetime
+import json
 from dateutil.parser import isoparse
 from dateutil.tz import tzutc
 
@@ -136,3 +137,41 @@ class ServerHandlersTest(TestCase):
             data = self._assert_status(200, fn, *params)
             aggregated = data['statistics'][0]['payload']['data']['datasets'][0]['data']
             self.assertEqual(len(aggregated), count)
+
+    def test_add_data_many(self):
+        s = ServerHandlers(DictConnection())
+        topic_id = self._create_topic(s, dict(name="topic", fields=["number"]))
+
+        self._assert_status(400, s.add_data_many, dict(number=3))
+        response = self._assert_status(200, s.add_data_many, [
+            dict(topic_id=topic_id, number=1, timestamp="2020-01-01T01:00:00Z"),
+            dict(topic_id=topic_id, number=2, timestamp="invalid"),
+            "invalid",
+            dict(topic_id=topic_id, number=3),
+        ])
+
+        results = response["results"]
+        self.assertEqual(results[0]["timestamp"], "2020-01-01T01:00:00Z")
+        self.assertIn("error", results[1])
+        self.assertIn("error", results[2])
+        self.assertIn("timestamp", results[3])
+        response = self._assert_status(200, s.get_data, topic_id, {})
+        self.assertEqual(len(response), 2)
+
+    def test_overview_stream(self):
+        C = DictConnection()
+        topic_id = C.add_topic(
+            "topic", fields=["number"], data_tools=[{"field":"number", "method":"latest"}])
+        C.add_data(topic_id, dict(number=3))
+        client = generate_app(db_connection=C).test_client()
+
+        response = client.get(f'/overview/stream?topic_ids={topic_id}')
+        lines = [json.loads(i) for i in response.data.decode().splitlines()]
+        self.assertEqual([i["type"] for i in lines], ["topic", "overview"])
+        self.assertEqual(lines[0]["topic_id"], topic_id)
+        self.assertEqual(lines[1]["overview"], C.get_overview([topic_id]))
+
+        response = client.get('/overview/stream?topic_ids=missing')
+        lines = [json.loads(i) for i in response.data.decode().splitlines()]
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(len(lines[0]["overview"]["warnings"]), 1)